@@ -1,16 +1,113 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from array import array
+import json
+import threading
+
+from fastapi import FastAPI, Response
+from pydantic import BaseModel, Field
 from typing import List
 
 app = FastAPI()
 
+# Ids are stored in an array('q').
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+
 class Tea(BaseModel):
-    id: int
+    id: int = Field(ge=INT64_MIN, le=INT64_MAX)
     name: str
     origin: str
 
-# Define teas as a regular list (no need for the type hint here)
-teas = []
+
+class TeaStore:
+    # Teas kept as columns instead of one Tea object each: ids in an
+    # array('q'), names in a list, and origins dictionary-encoded (each
+    # distinct origin stored once, rows hold its code). Names and origins
+    # are kept JSON-encoded, so the listing is joined straight from the
+    # columns and cached until the next write; Tea models are only built
+    # when a single tea leaves the API. The handlers run in the threadpool,
+    # so every method holds the lock while it touches the columns.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = array("q")
+        self.names = []
+        self.origin_codes = array("I")
+        self.origins = []
+        self._origin_code = {}
+        self._body = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _code(self, origin):
+        code = self._origin_code.get(origin)
+        if code is None:
+            code = self._origin_code[origin] = len(self.origins)
+            self.origins.append(_encode(origin))
+        return code
+
+    def _find(self, tea_id):
+        # Row of the first tea with this id, or None.
+        try:
+            return self.ids.index(tea_id)
+        except ValueError:
+            return None
+
+    def _get(self, row):
+        return Tea.model_construct(
+            id=self.ids[row],
+            name=json.loads(self.names[row]),
+            origin=json.loads(self.origins[self.origin_codes[row]]),
+        )
+
+    def append(self, tea):
+        with self._lock:
+            self.ids.append(tea.id)
+            self.names.append(_encode(tea.name))
+            self.origin_codes.append(self._code(tea.origin))
+            self._body = None
+
+    def replace(self, tea_id, tea):
+        # Replaces the first tea with tea_id; False when there is none.
+        with self._lock:
+            row = self._find(tea_id)
+            if row is None:
+                return False
+            self.ids[row] = tea.id
+            self.names[row] = _encode(tea.name)
+            self.origin_codes[row] = self._code(tea.origin)
+            self._body = None
+            return True
+
+    def pop(self, tea_id):
+        # Removes and returns the first tea with tea_id, or None.
+        with self._lock:
+            row = self._find(tea_id)
+            if row is None:
+                return None
+            tea = self._get(row)
+            del self.ids[row]
+            del self.names[row]
+            del self.origin_codes[row]
+            self._body = None
+            return tea
+
+    def to_json(self):
+        with self._lock:
+            if self._body is None:
+                rows = ",".join(map(_ROW.format, self.ids, self.names, map(self.origins.__getitem__, self.origin_codes)))
+                self._body = f"[{rows}]".encode()
+            return self._body
+
+
+_ROW = '{{"id":{},"name":{},"origin":{}}}'
+
+
+def _encode(text):
+    return json.dumps(text, ensure_ascii=False)
+
+
+teas = TeaStore()
 
 @app.get("/")
 def read_root():
@@ -18,7 +115,7 @@ def read_root():
 
 @app.get("/teas", response_model=List[Tea])
 def get_teas():
-    return teas
+    return Response(teas.to_json(), media_type="application/json")
 
 @app.post("/teas")
 def add_tea(tea: Tea):
@@ -27,16 +124,13 @@ def add_tea(tea: Tea):
 
 @app.put("/teas/{tea_id}")
 def update_tea(tea_id: int, updated_tea: Tea):
-    for index, tea in enumerate(teas):
-        if tea.id == tea_id:
-            teas[index] = updated_tea
-            return updated_tea
+    if teas.replace(tea_id, updated_tea):
+        return updated_tea
     return {"error": "Tea not found"}, 404
 
 @app.delete("/teas/{tea_id}")
 def delete_tea(tea_id: int):
-    for index, tea in enumerate(teas):
-        if tea.id == tea_id:
-            deleted = teas.pop(index)
-            return deleted
+    tea = teas.pop(tea_id)
+    if tea is not None:
+        return tea
     return {"error": "Tea not found"}, 404
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Async access to a JSON file holding one top-level object. File reads and
+# decodes never run on the event loop: they go to a small dedicated thread
+# pool, so a slow disk cannot take the default threadpool's slots. Files
+# over PROCESS_DECODE_BYTES are decoded in a process pool, which keeps the
+# GIL free for the loop while a big file is parsed.
+
+READ_WORKERS = int(os.getenv("JSONSTORE_WORKERS", "2"))
+PROCESS_DECODE_BYTES = int(os.getenv("JSONSTORE_PROCESS_DECODE_BYTES", str(4 * 1024 * 1024)))
+PROCESS_WORKERS = int(os.getenv("JSONSTORE_PROCESS_WORKERS", "1"))
+READ_CHUNK = 64 * 1024
+SCAN_BATCH = 256
+
+_threads = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix="jsonstore")
+_processes = None
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def _process_pool():
+    global _processes
+    if _processes is None:
+        _processes = ProcessPoolExecutor(max_workers=PROCESS_WORKERS)
+    return _processes
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        mtime = os.fstat(f.fileno()).st_mtime_ns
+        return mtime, f.read()
+
+
+def _read_decoded(path):
+    mtime, raw = _read(path)
+    return mtime, json.loads(raw)
+
+
+def _write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    return os.stat(path).st_mtime_ns
+
+
+def iter_records(path, chunk_size=READ_CHUNK):
+    # Yields (key, value) from the top-level JSON object while holding only
+    # the current chunk of the file in memory.
+    with open(path, "r") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                pos = _whitespace.match(buf, pos).end()
+                if pos < len(buf) or eof:
+                    return
+                more()
+
+        def expect(char):
+            nonlocal pos
+            skip_ws()
+            if buf[pos:pos + 1] != char:
+                raise ValueError(f"expected {char!r} in {path}")
+            pos += 1
+
+        def value():
+            nonlocal pos
+            while True:
+                skip_ws()
+                try:
+                    v, end = _decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    more()
+                    continue
+                if end == len(buf) and not eof:
+                    # A number could continue in the next chunk.
+                    more()
+                    continue
+                pos = end
+                return v
+
+        more()
+        expect("{")
+        skip_ws()
+        if buf[pos:pos + 1] == "}":
+            return
+        while True:
+            key = value()
+            expect(":")
+            yield key, value()
+            skip_ws()
+            if buf[pos:pos + 1] == "}":
+                return
+            expect(",")
+
+
+def _count(path):
+    return sum(1 for _ in iter_records(path))
+
+
+def _take(records, n):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == n:
+            break
+    return batch
+
+
+class JsonStore:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self._data = None
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(_threads, fn, *args)
+
+    async def stat_mtime(self):
+        return (await self._run(os.stat, self.path)).st_mtime_ns
+
+    async def load(self):
+        # Whole object, cached until the file's mtime changes.
+        async with self._lock:
+            mtime = await self.stat_mtime()
+            if mtime == self.mtime:
+                return self._data
+            size = (await self._run(os.stat, self.path)).st_size
+            if size > PROCESS_DECODE_BYTES:
+                loop = asyncio.get_running_loop()
+                self.mtime, self._data = await loop.run_in_executor(_process_pool(), _read_decoded, self.path)
+            else:
+                self.mtime, self._data = await self._run(_read_decoded, self.path)
+            return self._data
+
+    async def get(self, key, default=None):
+        return (await self.load()).get(key, default)
+
+    async def count(self):
+        # Number of records: from the cached object while the file is
+        # unchanged, otherwise by streaming through the file.
+        if self._data is not None and await self.stat_mtime() == self.mtime:
+            return len(self._data)
+        return await self._run(_count, self.path)
+
+    async def scan(self, start=0, stop=None):
+        # Streams (key, value) pairs in file order for positions start..stop,
+        # stop exclusive, without decoding the whole file at once.
+        records = iter_records(self.path)
+        index = 0
+        try:
+            while stop is None or index < stop:
+                batch = await self._run(_take, records, SCAN_BATCH)
+                for record in batch:
+                    if stop is not None and index >= stop:
+                        return
+                    if index >= start:
+                        yield record
+                    index += 1
+                if len(batch) < SCAN_BATCH:
+                    return
+        finally:
+            await self._run(records.close)
+
+    async def save(self, data):
+        async with self._lock:
+            self.mtime = await self._run(_write, self.path, data)
+            self._data = data
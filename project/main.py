@@ -1,14 +1,185 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import asyncio
 import json
+import re
 
-app = FastAPI()
+import numpy as np
+from jsonstore import JsonStore
+
+DATA_FILE = "patients.json"
+# Streamed responses are flushed whenever this much output has built up.
+STREAM_BUFFER = 64 * 1024
+
+store = JsonStore(DATA_FILE)
+
+
+# BMI bands for the verdict: below 18.5, below 25, below 30, the rest.
+BMI_BANDS = np.array([18.5, 25.0, 30.0])
+VERDICTS = np.array(["Underweight", "Normal", "Overweight", "Obese"])
+SORTABLE = ("bmi", "height", "weight", "age")
+
+
+def _number(value):
+    # Missing or non-numeric fields become NaN.
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return np.nan
+
+
+# Work on whole columns as well as on single values. Without a positive
+# height and weight the bmi is NaN and the verdict "", both served as null.
+def _bmi(height, weight):
+    height = np.asarray(height, dtype=float)
+    weight = np.asarray(weight, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = np.round(weight / (height * height), 2)
+    return np.where((height > 0) & (weight > 0), bmi, np.nan)
+
+
+def _verdict(bmi):
+    return np.where(np.isnan(bmi), "", VERDICTS[np.searchsorted(BMI_BANDS, bmi, side="right")])
+
+
+def _derived(record, bmi, verdict):
+    return {**record, "bmi": None if np.isnan(bmi) else float(bmi), "verdict": str(verdict) or None}
+
+
+class PatientIndex:
+    # Keeps patients.json in column arrays with bmi and verdict worked out for
+    # the whole dataset at load time, plus a pre-sorted order per SORTABLE
+    # field. A reload recomputes only the records that changed.
+
+    def __init__(self, store):
+        self.store = store
+        self.mtime = None
+        self.ids = []
+        self.records = {}
+        self.position = {}
+        self.columns = {name: np.empty(0) for name in ("height", "weight", "age", "bmi")}
+        self.verdict = VERDICTS[:0]
+        self.order = {}
+        # Per sortable field, how many rows have a value; the rest (NaN) sit
+        # at the end of its order.
+        self.known = {}
+
+    async def refresh(self):
+        data = await self.store.load()
+        if self.store.mtime != self.mtime:
+            self._apply(data)
+            self.mtime = self.store.mtime
+        return self
+
+    def _apply(self, data):
+        changed = [pid for pid, record in data.items() if self.records.get(pid) != record]
+        if list(data) != self.ids:
+            # Patients were added or removed: rebuild the columns from scratch.
+            self.ids = list(data)
+            self.position = {pid: i for i, pid in enumerate(self.ids)}
+            n = len(self.ids)
+            self.columns = {name: np.zeros(n) for name in self.columns}
+            self.verdict = np.empty(n, dtype=VERDICTS.dtype)
+            changed = self.ids
+        self.records = data
+        if changed:
+            self._compute(changed)
+
+    def _compute(self, pids):
+        rows = np.fromiter((self.position[pid] for pid in pids), dtype=np.intp, count=len(pids))
+        for name in ("height", "weight", "age"):
+            self.columns[name][rows] = [_number(self.records[pid].get(name)) for pid in pids]
+        bmi = _bmi(self.columns["height"][rows], self.columns["weight"][rows])
+        self.columns["bmi"][rows] = bmi
+        self.verdict[rows] = _verdict(bmi)
+        # Sorting a few thousand floats is cheaper than patching the orders.
+        # argsort puts NaN last.
+        self.order = {name: np.argsort(self.columns[name], kind="stable") for name in SORTABLE}
+        self.known = {name: int(np.count_nonzero(~np.isnan(self.columns[name]))) for name in SORTABLE}
+
+    def record(self, i):
+        pid = self.ids[i]
+        return pid, _derived(self.records[pid], self.columns["bmi"][i], self.verdict[i])
+
+    def derive(self, pid, record):
+        # For records streamed from the file: the precomputed values, unless
+        # the file has changed since the last refresh.
+        i = self.position.get(pid)
+        if i is not None and self.records[pid] == record:
+            return self.record(i)[1]
+        bmi = _bmi(_number(record.get("height")), _number(record.get("weight")))
+        return _derived(record, bmi, _verdict(bmi))
+
+    def view(self, sort_by=None, descending=False):
+        if sort_by is None:
+            rows = range(len(self.ids))
+        else:
+            rows = self.order[sort_by]
+            if descending:
+                # Patients without a value stay last.
+                known = self.known[sort_by]
+                rows = np.concatenate((rows[:known][::-1], rows[known:]))
+        return dict(self.record(int(i)) for i in rows)
+
+
+patients = PatientIndex(store)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # patients.json is parsed in the background right after startup instead
+    # of on the first /view; /ready answers 503 until it has been loaded.
+    loading = asyncio.create_task(patients.refresh())
+    yield
+    loading.cancel()
+    await asyncio.gather(loading, return_exceptions=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _parse_range(header):
+    # "records=<first>-[<last>]", zero based and inclusive, like byte ranges.
+    # None for any other range unit: RFC 9110 says to ignore those.
+    unit, _, spec = header.strip().partition("=")
+    if unit.strip().lower() != "records":
+        return None
+    match = re.fullmatch(r"(\d+)-(\d*)", spec.strip())
+    if not match:
+        raise HTTPException(status_code=416, detail="Range must look like records=<first>-[<last>]")
+    first = int(match.group(1))
+    last = int(match.group(2)) if match.group(2) else None
+    if last is not None and last < first:
+        raise HTTPException(status_code=416, detail="Range last must not be before first")
+    return first, last
+
+
+async def _stream(fmt, first, last):
+    parts = []
+    size = 0
+    if fmt == "json":
+        parts.append("{")
+    stop = None if last is None else last + 1
+    separator = ""
+    async for key, record in store.scan(first, stop):
+        record = patients.derive(key, record)
+        if fmt == "ndjson":
+            part = json.dumps({"id": key, **record}) + "\n"
+        else:
+            part = separator + json.dumps(key) + ":" + json.dumps(record)
+            separator = ","
+        parts.append(part)
+        size += len(part)
+        if size >= STREAM_BUFFER:
+            yield "".join(parts)
+            parts = []
+            size = 0
+    if fmt == "json":
+        parts.append("}")
+    if parts:
+        yield "".join(parts)
 
-def load_data():
-    with open("patients.json", "r") as f:
-        data = json.load(f)
-        
-    return data
-      
 @app.get("/")
 def hello():
     return {"message": "Patient Management System API"}
@@ -17,9 +188,39 @@ def hello():
 def about():
     return {"message": "A fully functional API for managing patient records."}
 
+@app.get("/ready")
+def ready(response: Response):
+    if patients.mtime is None:
+        response.status_code = 503
+        return {"ready": False}
+    return {"ready": True}
+
 @app.get("/view")
-def view():
-    data = load_data()
-    
-    return data
+async def view(
+    stream: bool = Query(False, description="Stream records instead of building one response"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json object or one record per line"),
+    range_: Optional[str] = Header(None, alias="range", description="records=<first>-[<last>] to resume a streamed download"),
+    sort_by: Optional[str] = Query(None, pattern=f"^({'|'.join(SORTABLE)})$", description="Sort patients by this field"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+):
+    requested = _parse_range(range_) if range_ else None
+    if not stream and format == "json" and requested is None:
+        return (await patients.refresh()).view(sort_by, order == "desc")
+    if sort_by is not None:
+        raise HTTPException(status_code=400, detail="sort_by is not supported when streaming")
+
+    # Streams straight from the file; derive() works out bmi and verdict per
+    # record, so nothing is loaded as a whole.
+    first, last = requested or (0, None)
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    headers = {"Accept-Ranges": "records"}
+    status_code = 200
+    if requested:
+        total = await store.count()
+        if first >= total:
+            raise HTTPException(status_code=416, detail="Range starts after the last record", headers={"Content-Range": f"records */{total}"})
+        last = total - 1 if last is None else min(last, total - 1)
+        status_code = 206
+        headers["Content-Range"] = f"records {first}-{last}/{total}"
+    return StreamingResponse(_stream(format, first, last), status_code=status_code, media_type=media_type, headers=headers)
 
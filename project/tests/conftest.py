@@ -0,0 +1,24 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+from jsonstore import JsonStore  # noqa: E402
+
+
+@pytest.fixture
+def patients_file(tmp_path, monkeypatch):
+    # write(data) points the app at a scratch patients file holding data.
+    def write(data):
+        path = tmp_path / "patients.json"
+        path.write_text(json.dumps(data))
+        store = JsonStore(str(path))
+        monkeypatch.setattr(main, "store", store)
+        monkeypatch.setattr(main, "patients", main.PatientIndex(store))
+        return path
+
+    return write
@@ -0,0 +1,49 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+PATIENTS = {
+    "P001": {"name": "Ananya", "age": 28, "height": 1.65, "weight": 90.0},
+    "P002": {"name": "Ravi", "age": 35, "height": 1.75, "weight": 60.0},
+    "P003": {"name": "Sneha", "height": 0, "weight": 55.0},
+    "P004": {"name": "Arjun", "age": 40, "weight": 70.0},
+}
+
+
+def test_incomplete_records_have_no_bmi(patients_file):
+    patients_file(PATIENTS)
+    with TestClient(main.app) as client:
+        view = client.get("/view").json()
+        assert view["P001"]["verdict"] == "Obese"
+        for pid in ("P003", "P004"):
+            assert view[pid]["bmi"] is None and view[pid]["verdict"] is None
+        streamed = json.loads(client.get("/view?stream=true").text)
+        lines = [json.loads(line) for line in client.get("/view?format=ndjson").text.splitlines()]
+        assert streamed == view
+        assert {line.pop("id"): line for line in lines} == view
+
+
+def test_unknown_values_sort_last(patients_file):
+    patients_file(PATIENTS)
+    with TestClient(main.app) as client:
+        assert list(client.get("/view?sort_by=bmi").json()) == ["P002", "P001", "P003", "P004"]
+        assert list(client.get("/view?sort_by=bmi&order=desc").json()) == ["P001", "P002", "P003", "P004"]
+        assert list(client.get("/view?sort_by=age&order=desc").json()) == ["P004", "P002", "P001", "P003"]
+
+
+def test_stream_does_not_load_the_file(patients_file, monkeypatch):
+    patients_file(PATIENTS)
+
+    async def load():
+        raise AssertionError("streaming loaded the whole file")
+
+    with TestClient(main.app) as client:
+        assert client.get("/view", headers={"Range": "bytes=0-10"}).json() == client.get("/view").json()
+        monkeypatch.setattr(main.store, "load", load)
+        assert list(json.loads(client.get("/view?stream=true").text)) == list(PATIENTS)
+        response = client.get("/view", headers={"Range": "records=1-"})
+        assert response.status_code == 206
+        assert response.headers["content-range"] == "records 1-3/4"
+        assert client.get("/view", headers={"Range": "records=4-"}).status_code == 416
@@ -0,0 +1,123 @@
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException, Request, status
+
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+ROUTE_CONCURRENCY = int(os.getenv("ROUTE_CONCURRENCY", "64"))
+ROUTE_QUEUE_TIMEOUT = float(os.getenv("ROUTE_QUEUE_TIMEOUT", "1"))
+MAX_DB_SESSIONS = int(os.getenv("MAX_DB_SESSIONS", "32"))
+DB_QUEUE_TIMEOUT = float(os.getenv("DB_QUEUE_TIMEOUT", "2"))
+# Once requests have been queueing longer than this on average, new ones are
+# shed straight away instead of joining the queue.
+QUEUE_LATENCY_TARGET = float(os.getenv("QUEUE_LATENCY_TARGET", "0.5"))
+# Comma-separated addresses or networks of the proxies in front of the app.
+# Only their X-Client-Id is believed; anyone else is limited by address.
+TRUSTED_PROXIES = [ipaddress.ip_network(p.strip()) for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()]
+
+# Long-lived streams would pin a route slot for their whole lifetime.
+UNLIMITED_ROUTES = {"/restaurants/changes/stream"}
+
+
+def _reject(code: int, retry_after: float, detail: str):
+    raise HTTPException(status_code=code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
+class MemoryRateLimitBackend:
+    # Token buckets kept in this process. A shared backend (Redis etc.) only
+    # needs the same async take() and can be installed with
+    # set_rate_limit_backend().
+    def __init__(self, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (1 - tokens) / rate
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+rate_limit_backend = MemoryRateLimitBackend()
+
+
+def set_rate_limit_backend(backend):
+    global rate_limit_backend
+    rate_limit_backend = backend
+
+
+class AdmissionQueue:
+    def __init__(self, name: str, limit: int, timeout: float, target: float = QUEUE_LATENCY_TARGET):
+        self.name = name
+        self.timeout = timeout
+        self.target = target
+        self.recent_wait = 0.0
+        self._slots = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._slots.locked() and self.recent_wait > self.target:
+            _reject(status.HTTP_503_SERVICE_UNAVAILABLE, self.recent_wait, f"{self.name} overloaded")
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self.recent_wait = 0.8 * self.recent_wait + 0.2 * self.timeout
+            _reject(status.HTTP_503_SERVICE_UNAVAILABLE, self.timeout, f"{self.name} overloaded")
+        self.recent_wait = 0.8 * self.recent_wait + 0.2 * (time.monotonic() - start)
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+
+db_sessions = AdmissionQueue("database", MAX_DB_SESSIONS, DB_QUEUE_TIMEOUT)
+_route_queues = {}
+
+
+def _trusted(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_key(request: Request) -> str:
+    host = request.client.host if request.client else "anonymous"
+    client_id = request.headers.get("X-Client-Id")
+    if client_id and _trusted(host):
+        return f"id:{client_id}"
+    return host
+
+
+async def admit(request: Request):
+    wait = await rate_limit_backend.take(client_key(request), RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+    if wait > 0:
+        _reject(status.HTTP_429_TOO_MANY_REQUESTS, wait, "Rate limit exceeded")
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if path in UNLIMITED_ROUTES:
+        yield
+        return
+    key = f"{request.method} {path}"
+    queue = _route_queues.get(key)
+    if queue is None:
+        queue = _route_queues[key] = AdmissionQueue(key, ROUTE_CONCURRENCY, ROUTE_QUEUE_TIMEOUT)
+    async with queue.slot():
+        yield
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+import crud
+from database import shard_sessions
+
+# Hot/cold tiering. Restaurants inactive for longer than ARCHIVE_AFTER_DAYS
+# move from restaurants to restaurants_archive, ARCHIVE_BATCH rows per
+# transaction, so the hot table and its indexes only hold the live catalog.
+# Reads by id still find them (crud.get_restaurant falls back); listings and
+# writes don't. ARCHIVE_AFTER_DAYS=0 turns the archiver off.
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+
+logger = logging.getLogger("zomato.archive")
+
+
+async def archive_once() -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    moved = 0
+    for factory in shard_sessions:
+        while True:
+            async with factory() as db:
+                ids = await crud.archive_inactive_restaurants(db, cutoff, ARCHIVE_BATCH)
+            moved += len(ids)
+            if len(ids) < ARCHIVE_BATCH:
+                break
+            # Let queued writers in between batches.
+            await asyncio.sleep(0)
+    return moved
+
+
+async def archive_forever():
+    while True:
+        try:
+            moved = await archive_once()
+            if moved:
+                logger.info("archived %d inactive restaurants", moved)
+        except Exception:
+            logger.exception("archiving failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Micro-benchmark: a 100-row listing page loaded as ORM entities (the old
+# list path) against the Core column select crud.list_restaurants uses now,
+# both serialised through RestaurantOut as the route does.
+# Usage: python bench_reads.py [pages]
+
+PAGE = 100
+SEED_ROWS = 5000
+
+
+def _seed_rows():
+    return [
+        {
+            "name": f"Restaurant {i}",
+            "description": "Family run place with a long menu",
+            "cuisine_type": "Indian",
+            "address": f"{i} Food Street",
+            "phone_number": f"+91{9000000000 + i}",
+            "rating": 4.1,
+            "is_active": True,
+        }
+        for i in range(SEED_ROWS)
+    ]
+
+
+async def run(pages):
+    from sqlalchemy import insert, select
+    import crud
+    import database
+    import migrations
+    from models import Restaurant
+    from schemas import RestaurantOut
+
+    await migrations.upgrade()
+    async with database.async_session() as db:
+        await db.execute(insert(Restaurant), _seed_rows())
+        await db.commit()
+
+    async def orm_page(db, skip):
+        q = await db.execute(select(Restaurant).offset(skip).limit(PAGE).order_by(Restaurant.id))
+        return [RestaurantOut.model_validate(r).model_dump() for r in q.scalars().all()]
+
+    async def core_page(db, skip):
+        return [RestaurantOut.model_validate(r).model_dump() for r in await crud.list_restaurants(db, skip, PAGE)]
+
+    async def measure(fn):
+        async with database.async_session() as db:
+            assert len(await fn(db, 0)) == PAGE
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                for p in range(pages):
+                    await fn(db, p * PAGE % (SEED_ROWS - PAGE))
+                best = min(best, time.perf_counter() - start)
+            tracemalloc.start()
+            await fn(db, 0)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return pages * PAGE / best, peak / PAGE
+
+    async with database.async_session() as db:
+        assert await orm_page(db, 0) == await core_page(db, 0)
+    before, before_mem = await measure(orm_page)
+    after, after_mem = await measure(core_page)
+    await database.dispose_engines()
+    print(f"ORM entities:  {before:>10,.0f} rows/s  {before_mem:>7,.0f} B/row peak")
+    print(f"Core columns:  {after:>10,.0f} rows/s  {after_mem:>7,.0f} B/row peak  ({after / before:.1f}x)")
+
+
+def main(argv):
+    import warnings
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    pages = int(argv[1]) if len(argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(run(pages))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
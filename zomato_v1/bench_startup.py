@@ -0,0 +1,140 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+# Cold-start benchmark for the FastAPI apps in this repository. For each app:
+#   import  seconds to `import main` in a fresh interpreter (best of REPEATS)
+#   ready   seconds from spawning uvicorn until its readiness probe answers 200
+#   first   seconds for the first data request once ready
+# zomato_v1 runs against a temporary database seeded with SEED_ROWS
+# restaurants. Exits 1 when any app's time-to-ready is over its budget.
+# Usage: python bench_startup.py [seed_rows]
+
+REPEATS = 3
+SEED_ROWS = 20000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name: (directory, readiness probe, first data request, budget in seconds)
+APPS = {
+    "zomato_v1": (HERE, "/ready", "/restaurants/cuisines", 4.0),
+    "project": (os.path.join(HERE, "..", "project"), "/ready", "/view", 2.0),
+    "fastapi": (os.path.join(HERE, "..", "fastapi"), "/", "/teas", 2.0),
+}
+
+_IMPORT = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+CUISINES = ["Indian", "Chinese", "Italian", "Mexican", "Thai", "Japanese", "Continental", "Cafe"]
+WORDS = "spicy family rooftop vegan grill noodles wood fired pizza dosa biryani sushi tacos brunch coffee dessert".split()
+
+
+def _seed_rows(n):
+    return [
+        {
+            "name": f"Restaurant {i}",
+            "description": " ".join(WORDS[(i * k) % len(WORDS)] for k in range(1, 6)),
+            "cuisine_type": CUISINES[i % len(CUISINES)],
+            "address": f"{i} Food Street",
+            "phone_number": f"+91{9000000000 + i}",
+            "rating": round(1 + (i * 7 % 40) / 10, 1),
+            "is_active": i % 10 != 0,
+        }
+        for i in range(n)
+    ]
+
+
+async def _seed(n):
+    from sqlalchemy import insert
+    import database
+    import migrations
+    from models import Restaurant
+
+    await migrations.upgrade()
+    async with database.async_session() as db:
+        await db.execute(insert(Restaurant), _seed_rows(n))
+        await db.commit()
+    await database.dispose_engines()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as r:
+            r.read()
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def _import_seconds(directory, env):
+    runs = [
+        float(subprocess.run([sys.executable, "-c", _IMPORT], cwd=directory, env=env, capture_output=True, text=True, check=True).stdout)
+        for _ in range(REPEATS)
+    ]
+    return min(runs)
+
+
+def _boot(directory, probe, first, env, timeout=60):
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=directory,
+        env=env,
+    )
+    try:
+        while _get(base + probe) != 200:
+            if server.poll() is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError(f"{directory} never became ready")
+            time.sleep(0.01)
+        ready = time.perf_counter() - start
+        start = time.perf_counter()
+        status = _get(base + first)
+        if status != 200:
+            raise RuntimeError(f"GET {first} answered {status}")
+        return ready, time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(argv):
+    import warnings
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    seed_rows = int(argv[1]) if len(argv) > 1 else SEED_ROWS
+    over = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        asyncio.run(_seed(seed_rows))
+        env = {
+            **os.environ,
+            "AUTO_MIGRATE": "0",
+            "SNAPSHOT_PATH": os.path.join(tmp, "catalog.snapshot"),
+            "JOBS_DIR": os.path.join(tmp, "jobs"),
+        }
+        print(f"{'app':<10} {'import':>8} {'ready':>8} {'first':>8} {'budget':>8}")
+        for name, (directory, probe, first, budget) in APPS.items():
+            imported = _import_seconds(directory, env)
+            ready, first_request = _boot(directory, probe, first, env)
+            flag = "" if ready <= budget else "  OVER BUDGET"
+            if flag:
+                over.append(name)
+            print(f"{name:<10} {imported:>7.3f}s {ready:>7.3f}s {first_request:>7.3f}s {budget:>7.1f}s{flag}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,61 @@
+import json
+import sys
+import time
+
+from schemas import RestaurantCreate, RestaurantCreateList
+
+# Micro-benchmark: per-object validation + .dict() (the old create path)
+# against one TypeAdapter validate_json + dump_python round trip on the
+# same array (the bulk create path).
+# Usage: python bench_validation.py [count]
+
+
+def make_payload(count):
+    return [
+        {
+            "name": f"Restaurant {i}",
+            "description": "Family run place with a long menu",
+            "cuisine_type": "Indian",
+            "address": f"{i} Food Street",
+            "phone_number": f"+91{9000000000 + i}",
+            "rating": 4.1,
+            "is_active": True,
+            "opening_time": "10:00:00",
+            "closing_time": "22:30:00",
+        }
+        for i in range(count)
+    ]
+
+
+def per_object(raw: bytes):
+    return [RestaurantCreate(**d).dict() for d in json.loads(raw)]
+
+
+def batch(raw: bytes):
+    return RestaurantCreateList.dump_python(RestaurantCreateList.validate_json(raw))
+
+
+def measure(fn, raw, count, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def main(argv):
+    import warnings
+
+    warnings.simplefilter("ignore", DeprecationWarning)
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    raw = json.dumps(make_payload(count)).encode()
+    assert per_object(raw) == batch(raw)
+    before = measure(per_object, raw, count)
+    after = measure(batch, raw, count)
+    print(f"per-object validate + .dict(): {before:>10,.0f} objects/s")
+    print(f"TypeAdapter batch round trip:  {after:>10,.0f} objects/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import math
+import os
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from sqlalchemy import func, select
+from changefeed import list_changes
+from database import next_read_session, shard_sessions
+from models import Restaurant, RestaurantChange
+import snapshot
+
+# Other workers' writes are replayed from the change outbox this often.
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "5"))
+# How often one worker rewrites the shared snapshot file; 0 disables it.
+SNAPSHOT_SECONDS = float(os.getenv("SNAPSHOT_SECONDS", "60"))
+
+# Columns handed to subscribers (see CatalogCache.subscribe).
+LISTENER_COLUMNS = ("id", "name", "description", "cuisine_type", "rating", "is_active", "opening_time", "closing_time")
+
+
+def _listener_row(row) -> dict:
+    if isinstance(row, dict):
+        return {c: row[c] for c in LISTENER_COLUMNS}
+    return {c: getattr(row, c) for c in LISTENER_COLUMNS}
+
+
+class CatalogCache:
+    def __init__(self):
+        self.cuisine_by_id = {}
+        self.cuisine_counts = Counter()
+        self.seq = 0
+        # Outbox positions of shards 1.. (self.seq is shard 0, the primary).
+        self.shard_seqs = [0] * (len(shard_sessions) - 1)
+        self.ready = False
+        # Mapped snapshot, and the ids changed after it was taken (id -> seq
+        # of the latest change seen).
+        self.snapshots_enabled = SNAPSHOT_SECONDS > 0
+        self.snapshot = None
+        self.dirty = {}
+        self.listeners = []
+        # Rows of a backend without a database (REPOSITORY_BACKEND=memory),
+        # as a callable; when set, warm loads from it and nothing is replayed.
+        self.source = None
+        self._loading = asyncio.Lock()
+        # Changes seen while a load is building, or None.
+        self._pending = None
+
+    def subscribe(self, listener):
+        # Derived in-process indexes follow the catalog. On warm, build(rows)
+        # runs in a worker thread and must not touch the live index; swap()
+        # then installs what it returned. After that put(row) and discard(id)
+        # for every local or replayed change. Rows are dicts of
+        # LISTENER_COLUMNS.
+        self.listeners.append(listener)
+
+    async def warm(self):
+        # The startup warm and a reindex job may overlap; one load at a time.
+        async with self._loading:
+            await self._warm()
+
+    async def _warm(self):
+        if self.source is not None:
+            await self._load([_listener_row(row) for row in self.source()])
+            self.ready = True
+            return
+        if self.snapshots_enabled and self._use_snapshot(snapshot.load_snapshot()):
+            # Ready straight away; the refresh loop catches up from the outbox.
+            snap = self.snapshot
+            rows = await asyncio.to_thread(lambda: [_listener_row(snap.row(i)) for i in range(len(snap))])
+            await self._load(rows)
+            self.seq = snap.seq
+            self.ready = True
+            return
+        seqs = []
+        rows = []
+        for factory in shard_sessions:
+            async with factory() as db:
+                # Read the outbox position first: anything committed after it
+                # is replayed by catch_up, and replaying is idempotent.
+                seqs.append((await db.execute(select(func.max(RestaurantChange.seq)))).scalar() or 0)
+                result = await db.execute(select(*(Restaurant.__table__.columns[c] for c in LISTENER_COLUMNS)))
+                # Converting 100k rows takes a while; not on the loop.
+                rows.extend(await asyncio.to_thread(lambda: [r._asdict() for r in result]))
+        await self._load(rows)
+        self.seq, *self.shard_seqs = seqs
+        self.ready = True
+
+    async def _load(self, rows):
+        # Requests keep being served from the old indexes while the new ones
+        # are built; changes seen meanwhile are replayed on top of the swap.
+        self._pending = []
+        try:
+            cuisine_by_id, built = await asyncio.to_thread(self._build, rows)
+        finally:
+            pending, self._pending = self._pending, None
+        self.cuisine_by_id = cuisine_by_id
+        self.cuisine_counts = Counter(cuisine_by_id.values())
+        for listener, state in zip(self.listeners, built):
+            listener.swap(state)
+        for method, args in pending:
+            method(*args)
+
+    def _build(self, rows):
+        return {r["id"]: r["cuisine_type"] for r in rows}, [listener.build(rows) for listener in self.listeners]
+
+    async def catch_up(self):
+        if self.source is not None:
+            return
+        self.seq = await self._replay(next_read_session, self.seq)
+        for i, factory in enumerate(shard_sessions[1:]):
+            self.shard_seqs[i] = await self._replay(lambda: factory, self.shard_seqs[i])
+
+    async def _replay(self, pick_session, seq: int) -> int:
+        # Snapshots cover shard 0 only and are off when sharded, so another
+        # shard's seqs are never compared with snapshot.seq.
+        while True:
+            async with pick_session()() as db:
+                changes = await list_changes(db, since=seq)
+            for change in changes:
+                if change.op in ("delete", "archive"):
+                    self.discard(change.restaurant_id, change.seq)
+                else:
+                    self.put(json.loads(change.data), change.seq)
+                seq = change.seq
+            if not changes:
+                return seq
+
+    def _use_snapshot(self, snap) -> bool:
+        if snap is None or (self.snapshot is not None and snap.seq <= self.snapshot.seq):
+            return False
+        self.snapshot = snap
+        self.dirty = {i: seq for i, seq in self.dirty.items() if seq > snap.seq}
+        return True
+
+    def snapshot_row(self, restaurant_id: int):
+        # Row from the mapped snapshot, unless it changed after the snapshot.
+        if self.snapshot is None or restaurant_id in self.dirty:
+            return None
+        return self.snapshot.get(restaurant_id)
+
+    def cuisines(self):
+        return sorted(self.cuisine_counts.items())
+
+    # restaurant is an ORM object, a result row or an outbox dict. seq is the
+    # change's outbox position; writes that have none (the in-memory
+    # repository) count as newer than any snapshot.
+    def put(self, restaurant, seq: float = math.inf):
+        row = _listener_row(restaurant)
+        if self._pending is not None:
+            self._pending.append((self.put, (row, seq)))
+        self._mark_dirty(row["id"], seq)
+        self._forget(row["id"])
+        self.cuisine_by_id[row["id"]] = row["cuisine_type"]
+        self.cuisine_counts[row["cuisine_type"]] += 1
+        for listener in self.listeners:
+            listener.put(row)
+
+    def _mark_dirty(self, restaurant_id: int, seq: float):
+        if self.snapshot is not None and seq > self.snapshot.seq:
+            self.dirty[restaurant_id] = max(seq, self.dirty.get(restaurant_id, 0))
+
+    def discard(self, restaurant_id: int, seq: float = math.inf):
+        if self._pending is not None:
+            self._pending.append((self.discard, (restaurant_id, seq)))
+        self._mark_dirty(restaurant_id, seq)
+        self._forget(restaurant_id)
+        for listener in self.listeners:
+            listener.discard(restaurant_id)
+
+    def _forget(self, restaurant_id: int):
+        cuisine = self.cuisine_by_id.pop(restaurant_id, None)
+        if cuisine is None:
+            return
+        self.cuisine_counts[cuisine] -= 1
+        if self.cuisine_counts[cuisine] <= 0:
+            del self.cuisine_counts[cuisine]
+
+    async def refresh_forever(self):
+        while True:
+            await self.catch_up()
+            await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+
+    async def snapshot_forever(self):
+        # Every worker runs this; a non-blocking file lock lets one of them
+        # write while the others just map the newer file.
+        while True:
+            await asyncio.sleep(SNAPSHOT_SECONDS)
+            await self.write_snapshot()
+            self._use_snapshot(snapshot.load_snapshot())
+
+    async def write_snapshot(self):
+        if self.snapshot is not None and self.seq <= self.snapshot.seq:
+            return
+        with open(f"{snapshot.SNAPSHOT_PATH}.lock", "w") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            async with next_read_session()() as db:
+                await snapshot.dump_catalog(db)
+
+
+catalog = CatalogCache()
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import os
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import next_read_session, shard_sessions
+from models import RestaurantChange
+
+CHANGES_PAGE_SIZE = int(os.getenv("CHANGES_PAGE_SIZE", "100"))
+# Writes from other workers are only seen by polling, at most this often.
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", "2"))
+
+
+class ChangeNotifier:
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+notifier = ChangeNotifier()
+
+
+async def list_changes(db: AsyncSession, since: int = 0, limit: int = CHANGES_PAGE_SIZE):
+    q = await db.execute(
+        select(RestaurantChange).where(RestaurantChange.seq > since).order_by(RestaurantChange.seq).limit(limit)
+    )
+    return q.scalars().all()
+
+
+def change_out(change) -> dict:
+    return {
+        "seq": change.seq,
+        "restaurant_id": change.restaurant_id,
+        "op": change.op,
+        "data": json.loads(change.data) if change.data else None,
+        "created_at": change.created_at.isoformat(),
+    }
+
+
+async def stream_changes(since: int, shard: int = 0):
+    # Server-Sent Events. A page is only fetched after the previous one has
+    # been handed to the client, so a slow consumer pauses the query loop
+    # instead of growing a buffer. Each page uses its own short-lived session.
+    # Every shard has its own outbox and seqs, so a feed follows one shard.
+    cursor = since
+    while True:
+        async with (shard_sessions[shard] if shard else next_read_session())() as db:
+            changes = await list_changes(db, since=cursor, limit=CHANGES_PAGE_SIZE)
+        for change in changes:
+            cursor = change.seq
+            yield f"id: {change.seq}\nevent: change\ndata: {json.dumps(change_out(change))}\n\n"
+        if len(changes) < CHANGES_PAGE_SIZE:
+            yield ": keep-alive\n\n"
+            await notifier.wait(CHANGES_POLL_SECONDS)
@@ -1,45 +1,192 @@
-from sqlalchemy import select, update, delete
+import json
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from sqlalchemy import bindparam, column, select, insert, table, update, delete, func
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from models import Restaurant
-from typing import List, Optional
-from schemas import RestaurantCreate, RestaurantUpdate
+from models import Restaurant, RestaurantArchive, RestaurantChange
+from cache import catalog
+from changefeed import notifier
+from typing import Dict, List, Optional, Tuple
+from schemas import RestaurantCreate, RestaurantCreateList, RestaurantFilter, RestaurantUpdate
+
+
+# Every write appends to the restaurant_changes outbox in the same
+# transaction, so change consumers never miss or see uncommitted rows.
+def _change(op: str, restaurant_id: int, row=None) -> RestaurantChange:
+    data = None
+    if row is not None:
+        data = json.dumps(
+            {c.name: getattr(row, c.name) for c in Restaurant.__table__.columns},
+            default=lambda v: v.isoformat(),
+        )
+    return RestaurantChange(restaurant_id=restaurant_id, op=op, data=data)
+
+
+_sequence = table("sqlite_sequence", column("name"), column("seq"))
+
+
+def _shard_id(shard: int, shards: int):
+    # Smallest id above the highest one the shard ever used (archived and
+    # deleted ids included) with id % shards == shard, so an id names its
+    # shard. Runs inside the INSERT, under the shard's write lock.
+    used = select(_sequence.c.seq).where(_sequence.c.name == Restaurant.__tablename__).scalar_subquery()
+    top = func.coalesce(used, 0)
+    return select(top + shards - ((top - shard) % shards + shards) % shards).scalar_subquery()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
 
 
-async def create_restaurant(db: AsyncSession, restaurant_in: RestaurantCreate) -> Restaurant:
-    new = Restaurant(**restaurant_in.dict())
+async def create_restaurant(db: AsyncSession, restaurant_in: RestaurantCreate, shard: Optional[Tuple[int, int]] = None) -> Restaurant:
+    new = Restaurant(**restaurant_in.model_dump())
+    if not new.is_active:
+        new.deactivated_at = _now()
+    if shard is not None:
+        new.id = _shard_id(*shard)
     db.add(new)
     try:
+        await db.flush()
+        change = _change("create", new.id, new)
+        db.add(change)
         await db.commit()
-        await db.refresh(new)
+        catalog.put(new, change.seq)
+        notifier.notify()
         return new
     except IntegrityError as e:
         await db.rollback()
         raise
 
 
-async def get_restaurant(db: AsyncSession, restaurant_id: int) -> Optional[Restaurant]:
+def publish(changes: List[RestaurantChange], rows=None):
+    # After commit: hands the rows (None for deletes) to the catalog and
+    # wakes change-feed readers.
+    if rows is None:
+        for change in changes:
+            catalog.discard(change.restaurant_id, change.seq)
+    else:
+        for row, change in zip(rows, changes):
+            catalog.put(row, change.seq)
+    notifier.notify()
+
+
+# stage_* run a batch write and add its outbox entries without committing,
+# so a caller spanning several shards can commit them together; the plain
+# versions below commit and publish straight away.
+async def stage_bulk_create(db: AsyncSession, restaurants_in: List[RestaurantCreate], shard: Optional[Tuple[int, int]] = None):
+    values = RestaurantCreateList.dump_python(restaurants_in)
+    now = _now()
+    for v in values:
+        v["deactivated_at"] = None if v["is_active"] else now
+    columns = Restaurant.__table__.columns
+    rows = []
+    if shard is not None:
+        # The first row takes the shard's write lock and its next id; the
+        # rest follow it one shard count apart, ids nobody has used yet.
+        q = await db.execute(insert(Restaurant).values(id=_shard_id(*shard)).returning(*columns), values[0])
+        rows = q.all()
+        for step, v in enumerate(values[1:], 1):
+            v["id"] = rows[0].id + step * shard[1]
+        values = values[1:]
+    if values:
+        q = await db.execute(insert(Restaurant).returning(*columns, sort_by_parameter_order=True), values)
+        rows += q.all()
+    changes = [_change("create", row.id, row) for row in rows]
+    db.add_all(changes)
+    await db.flush()
+    return rows, changes
+
+
+async def bulk_create_restaurants(db: AsyncSession, restaurants_in: List[RestaurantCreate], shard: Optional[Tuple[int, int]] = None) -> List[int]:
+    try:
+        rows, changes = await stage_bulk_create(db, restaurants_in, shard)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    publish(changes, rows)
+    return [row.id for row in rows]
+
+
+async def _get_hot(db: AsyncSession, restaurant_id: int) -> Optional[Restaurant]:
     q = await db.execute(select(Restaurant).where(Restaurant.id == restaurant_id))
-    result = q.scalars().first()
-    return result
+    return q.scalars().first()
+
+
+# Reads fall back to restaurants_archive on a miss; writes only ever see the
+# hot table, so an archived restaurant is read-only.
+async def get_restaurant(db: AsyncSession, restaurant_id: int):
+    return await _get_hot(db, restaurant_id) or await db.get(RestaurantArchive, restaurant_id)
+
+
+# Listings are read-only, so they select plain columns instead of ORM
+# entities: rows skip the identity map and attribute instrumentation and come
+# back as plain dicts, the cheapest input for RestaurantOut. The statements
+# are built once per column set with bound parameters, so every call hits the
+# compiled cache. fields=None selects every column; otherwise only the named
+# ones are read, so big TEXT columns stay on disk when nobody asked for them.
+Fields = Optional[Tuple[str, ...]]
+
+
+@lru_cache(maxsize=256)
+def _select(fields: Fields, kind: str):
+    table = RestaurantArchive.__table__ if kind == "archived_ids" else Restaurant.__table__
+    columns = [table.c[c.name] for c in Restaurant.__table__.columns]
+    query = select(*(columns if fields is None else (table.c[f] for f in fields)))
+    if kind in ("ids", "archived_ids"):
+        return query.where(table.c.id.in_(bindparam("ids", expanding=True)))
+    if kind in ("search", "search_active"):
+        query = query.where(Restaurant.cuisine_type.ilike(bindparam("cuisine")))
+    if kind in ("active", "search_active"):
+        query = query.where(Restaurant.is_active == True)
+    return query.order_by(Restaurant.id).offset(bindparam("skip")).limit(bindparam("limit"))
 
 
-async def list_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10) -> List[Restaurant]:
-    q = await db.execute(select(Restaurant).offset(skip).limit(limit).order_by(Restaurant.id))
-    return q.scalars().all()
+def _dicts(result) -> List[dict]:
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+# Ids per IN (...) query, well under SQLite's bound parameter limit.
+IN_CHUNK = 500
+
+
+async def get_restaurants_by_ids(db: AsyncSession, ids: List[int], fields: Fields = None) -> Dict[int, dict]:
+    found = {}
+    for query in (_select(fields, "ids"), _select(fields, "archived_ids")):
+        for start in range(0, len(ids), IN_CHUNK):
+            for row in _dicts(await db.execute(query, {"ids": ids[start:start + IN_CHUNK]})):
+                found[row["id"]] = row
+        ids = [i for i in ids if i not in found]
+        if not ids:
+            break
+    return found
+
+
+async def list_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10, fields: Fields = None):
+    return _dicts(await db.execute(_select(fields, "all"), {"skip": skip, "limit": limit}))
 
 
 async def update_restaurant(db: AsyncSession, restaurant_id: int, updates: RestaurantUpdate) -> Optional[Restaurant]:
-    existing = await get_restaurant(db, restaurant_id)
+    existing = await _get_hot(db, restaurant_id)
     if not existing:
         return None
 
-    for k, v in updates.dict(exclude_unset=True).items():
+    was_active = existing.is_active
+    for k, v in updates.model_dump(exclude_unset=True).items():
         setattr(existing, k, v)
+    if existing.is_active != was_active:
+        existing.deactivated_at = None if existing.is_active else _now()
     try:
         db.add(existing)
+        await db.flush()
+        change = _change("update", existing.id, existing)
+        db.add(change)
         await db.commit()
-        await db.refresh(existing)
+        catalog.put(existing, change.seq)
+        notifier.notify()
         return existing
     except IntegrityError:
         await db.rollback()
@@ -47,27 +194,158 @@ async def update_restaurant(db: AsyncSession, restaurant_id: int, updates: Resta
 
 
 async def delete_restaurant(db: AsyncSession, restaurant_id: int) -> bool:
-    existing = await get_restaurant(db, restaurant_id)
+    existing = await _get_hot(db, restaurant_id)
     if not existing:
         return False
     await db.delete(existing)
+    change = _change("delete", restaurant_id)
+    db.add(change)
     await db.commit()
+    catalog.discard(restaurant_id, change.seq)
+    notifier.notify()
     return True
 
 
-async def search_by_cuisine(db: AsyncSession, cuisine: str, skip: int = 0, limit: int = 10):
+async def get_restaurant_by_name(db: AsyncSession, name: str) -> Optional[Restaurant]:
+    q = await db.execute(select(Restaurant).where(Restaurant.name == name))
+    return q.scalars().first()
+
+
+async def find_duplicate(db: AsyncSession, names: List[str], phones: List[str], exclude_id: Optional[int] = None) -> Optional[str]:
+    # "name" or "phone_number" when a row other than exclude_id already
+    # uses one of them, else None.
+    for field, values in (("name", names), ("phone_number", phones)):
+        if not values:
+            continue
+        query = select(Restaurant.id).where(getattr(Restaurant, field).in_(values)).limit(1)
+        if exclude_id is not None:
+            query = query.where(Restaurant.id != exclude_id)
+        if (await db.execute(query)).first() is not None:
+            return field
+    return None
+
+
+def _list_conditions(cuisine: Optional[str], active_only: bool):
+    conditions = []
+    if cuisine:
+        conditions.append(Restaurant.cuisine_type.ilike(f"%{cuisine}%"))
+    if active_only:
+        conditions.append(Restaurant.is_active == True)
+    return conditions
+
+
+async def search_by_cuisine(db: AsyncSession, cuisine: str, skip: int = 0, limit: int = 10, active_only: bool = False, fields: Fields = None):
+    query = _select(fields, "search_active" if active_only else "search")
+    return _dicts(await db.execute(query, {"cuisine": f"%{cuisine}%", "skip": skip, "limit": limit}))
+
+
+async def list_active_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10, fields: Fields = None):
+    return _dicts(await db.execute(_select(fields, "active"), {"skip": skip, "limit": limit}))
+
+
+async def count_restaurants(db: AsyncSession, cuisine: Optional[str] = None, active_only: bool = False) -> int:
+    q = await db.execute(select(func.count()).select_from(Restaurant).where(*_list_conditions(cuisine, active_only)))
+    return q.scalar()
+
+
+def _batch_conditions(ids: Optional[List[int]], filter: Optional[RestaurantFilter]):
+    conditions = []
+    if ids is not None:
+        conditions.append(Restaurant.id.in_(ids))
+    if filter is not None:
+        if filter.cuisine_type is not None:
+            conditions.append(Restaurant.cuisine_type == filter.cuisine_type)
+        if filter.is_active is not None:
+            conditions.append(Restaurant.is_active == filter.is_active)
+    return conditions
+
+
+def batch_outcomes(ids: Optional[List[int]], affected, status: str) -> Dict[int, str]:
+    if ids is None:
+        return {i: status for i in sorted(affected)}
+    return {i: status if i in affected else "not_found" for i in dict.fromkeys(ids)}
+
+
+async def matching_ids(db: AsyncSession, ids: Optional[List[int]], filter: Optional[RestaurantFilter]) -> set:
+    q = await db.execute(select(Restaurant.id).where(*_batch_conditions(ids, filter)))
+    return set(q.scalars().all())
+
+
+async def stage_batch_update(db: AsyncSession, ids: Optional[List[int]], filter: Optional[RestaurantFilter], changes: dict):
+    changes = dict(changes)
+    if changes.get("is_active") is not None:
+        # Keep the original time for rows that were already inactive.
+        changes["deactivated_at"] = None if changes["is_active"] else func.coalesce(Restaurant.deactivated_at, _now())
     q = await db.execute(
-        select(Restaurant)
-        .where(Restaurant.cuisine_type.ilike(f"%{cuisine}%"))
-        .offset(skip)
-        .limit(limit)
+        update(Restaurant)
+        .where(*_batch_conditions(ids, filter))
+        .values(**changes, updated_at=func.now())
+        .returning(*Restaurant.__table__.columns)
+        .execution_options(synchronize_session=False)
     )
-    return q.scalars().all()
+    rows = q.all()
+    outbox = [_change("update", row.id, row) for row in rows]
+    db.add_all(outbox)
+    await db.flush()
+    return rows, outbox
 
 
-async def list_active_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10):
+async def batch_update_restaurants(db: AsyncSession, ids: Optional[List[int]], filter: Optional[RestaurantFilter], changes: dict) -> Dict[int, str]:
+    if not changes:
+        return batch_outcomes(ids, await matching_ids(db, ids, filter), "unchanged")
+    try:
+        rows, outbox = await stage_batch_update(db, ids, filter, changes)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    publish(outbox, rows)
+    return batch_outcomes(ids, {row.id for row in rows}, "updated")
+
+
+async def stage_batch_delete(db: AsyncSession, ids: Optional[List[int]], filter: Optional[RestaurantFilter]):
     q = await db.execute(
-        select(Restaurant).where(Restaurant.is_active == True).offset(skip).limit(limit)
+        delete(Restaurant)
+        .where(*_batch_conditions(ids, filter))
+        .returning(Restaurant.id)
+        .execution_options(synchronize_session=False)
     )
-    return q.scalars().all()
+    deleted = set(q.scalars().all())
+    outbox = [_change("delete", restaurant_id) for restaurant_id in deleted]
+    db.add_all(outbox)
+    await db.flush()
+    return deleted, outbox
 
+
+async def batch_delete_restaurants(db: AsyncSession, ids: Optional[List[int]], filter: Optional[RestaurantFilter]) -> Dict[int, str]:
+    deleted, outbox = await stage_batch_delete(db, ids, filter)
+    await db.commit()
+    publish(outbox)
+    return batch_outcomes(ids, deleted, "deleted")
+
+
+async def archive_inactive_restaurants(db: AsyncSession, deactivated_before: datetime, limit: int) -> List[int]:
+    # DELETE first so the write lock is taken up front; two workers archiving
+    # at once then just queue instead of copying the same rows twice.
+    candidates = (
+        select(Restaurant.id)
+        .where(Restaurant.is_active == False, Restaurant.deactivated_at < deactivated_before)
+        .order_by(Restaurant.deactivated_at)
+        .limit(limit)
+    )
+    q = await db.execute(
+        delete(Restaurant)
+        .where(Restaurant.id.in_(candidates.scalar_subquery()))
+        .returning(*Restaurant.__table__.columns)
+        .execution_options(synchronize_session=False)
+    )
+    rows = [row._asdict() for row in q]
+    if not rows:
+        await db.rollback()
+        return []
+    await db.execute(insert(RestaurantArchive), rows)
+    changes = [_change("archive", row["id"]) for row in rows]
+    db.add_all(changes)
+    await db.commit()
+    publish(changes)
+    return [row["id"] for row in rows]
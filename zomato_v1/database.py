@@ -1,19 +1,111 @@
+import itertools
+import os
+import time
+
+from fastapi import Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from admission import db_sessions
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./restaurant.db")
+
+# Comma separated replica URLs. When unset, reads go to READ_ENGINES read-only
+# connections on the primary SQLite file.
+READ_REPLICA_URLS = [u for u in os.getenv("READ_REPLICA_URLS", "").split(",") if u]
+READ_ENGINES = int(os.getenv("READ_ENGINES", "4"))
+
+# After a write, the client reads from the primary for this long so it always
+# sees its own changes even if a replica lags.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+CONSISTENCY_COOKIE = "rw_until"
+CONSISTENCY_HEADER = "X-Read-Your-Writes"
+
+
+class LazySessions(sessionmaker):
+    # Session factory that creates its engine on first use, so importing this
+    # module loads no driver and opens no pool; a worker only pays for the
+    # databases it actually talks to.
+    def __init__(self, url: str):
+        super().__init__(class_=AsyncSession, expire_on_commit=False)
+        self.url = url
+        self._engine = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = create_async_engine(self.url, future=True)
+            self.configure(bind=self._engine)
+        return self._engine
+
+    def __call__(self, **local_kw):
+        self.engine
+        return super().__call__(**local_kw)
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+
+
+def _read_only_url(url: str) -> str:
+    prefix, sep, path = url.partition(":///")
+    if not prefix.startswith("sqlite") or not sep or path in ("", ":memory:") or path.startswith("file:"):
+        return url
+    return f"{prefix}:///file:{path}?mode=ro&uri=true"
+
+
+async_session = LazySessions(DATABASE_URL)
 
-DATABASE_URL = "sqlite+aiosqlite:///./restaurant.db"
+if READ_REPLICA_URLS:
+    read_sessions = [LazySessions(url) for url in READ_REPLICA_URLS]
+else:
+    read_sessions = [LazySessions(_read_only_url(DATABASE_URL)) for _ in range(READ_ENGINES)]
+next_read_session = itertools.cycle(read_sessions).__next__
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# Extra shard databases for REPOSITORY_BACKEND=sharded, comma separated.
+# Shard 0 is always DATABASE_URL, so an unsharded deployment is one shard.
+SHARD_URLS = [u for u in os.getenv("SHARD_URLS", "").split(",") if u]
+shard_sessions = [async_session] + [LazySessions(url) for url in SHARD_URLS]
+
+
+async def dispose_engines():
+    for factory in shard_sessions + read_sessions:
+        await factory.dispose()
 
-async_session = sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-)
 
 Base = declarative_base()
 
-async def get_db():
-    async with async_session() as session:
+
+def wrote_recently(request: Request) -> bool:
+    token = request.headers.get(CONSISTENCY_HEADER) or request.cookies.get(CONSISTENCY_COOKIE)
+    try:
+        remaining = float(token) - time.time()
+    except (TypeError, ValueError):
+        return False
+    # A token from mark_wrote is never further ahead than the window (plus
+    # its rounding); anything beyond that was made up by the client.
+    return 0 < remaining <= READ_YOUR_WRITES_SECONDS + 0.001
+
+
+def mark_wrote(response: Response):
+    until = f"{time.time() + READ_YOUR_WRITES_SECONDS:.3f}"
+    response.set_cookie(CONSISTENCY_COOKIE, until, max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True)
+    response.headers[CONSISTENCY_HEADER] = until
+
+
+async def get_db(response: Response):
+    mark_wrote(response)
+    async with db_sessions.slot(), async_session() as session:
+        yield session
+
+
+def read_sessions_for(request: Request, shard: int = 0):
+    # Replicas and read-only engines only cover shard 0; the other shards
+    # are read directly.
+    if shard:
+        return shard_sessions[shard]
+    return async_session if wrote_recently(request) else next_read_session()
+
+
+async def get_read_db(request: Request):
+    async with db_sessions.slot(), read_sessions_for(request)() as session:
         yield session
-        
\ No newline at end of file
@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+from fastapi import HTTPException, status
+
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+
+# Remembers the results of the last max_keys keyed requests. A retry with a
+# known key gets the stored result instead of re-running the operation, and
+# concurrent requests with the same key run it only once. Each key also
+# keeps a hash of the request body: the key reused with a different body is
+# a client error (422), not a retry.
+class IdempotencyStore:
+
+    def __init__(self, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._results = OrderedDict()
+        self._locks = {}
+
+    def _stored(self, key, digest: bytes):
+        stored_digest, result = self._results[key]
+        if stored_digest != digest:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        return result
+
+    async def run(self, key, operation, body: bytes = b""):
+        if key is None:
+            return await operation()
+        digest = hashlib.sha256(body).digest()
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._stored(key, digest)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                if key in self._results:
+                    return self._stored(key, digest)
+                result = await operation()
+                self._results[key] = (digest, result)
+                if len(self._results) > self.max_keys:
+                    self._results.popitem(last=False)
+                return result
+        finally:
+            if not lock.locked():
+                self._locks.pop(key, None)
+
+
+idempotency_store = IdempotencyStore()
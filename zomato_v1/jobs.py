@@ -0,0 +1,466 @@
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from admission import admit
+from cache import catalog
+from database import async_session, next_read_session, shard_sessions
+from models import Job, Restaurant
+from repository import write_repository
+from schemas import JobCreate, RestaurantCreateList
+
+# Long catalog operations run here instead of inside a request. Jobs are rows
+# in the jobs table on shard 0; every worker runs a JobRunner that claims
+# queued jobs with an atomic UPDATE, at most JOBS_CONCURRENCY at a time, so
+# several workers can share one queue. Jobs read in short keyset pages and
+# hand CPU-heavy steps to a process pool, so the event loop and the request
+# sessions stay free. Progress reports double as heartbeat and cancellation
+# point.
+
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "2"))
+JOBS_PROCESS_WORKERS = int(os.getenv("JOBS_PROCESS_WORKERS", "1"))
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "2"))
+# A running job without a progress report for this long is taken over.
+JOBS_STALE_SECONDS = int(os.getenv("JOBS_STALE_SECONDS", "600"))
+# Exports and uploaded imports live here.
+JOBS_DIR = os.getenv("JOBS_DIR", "./jobs")
+# At shutdown running jobs get this long to reach a progress report and be
+# requeued before they are cancelled outright.
+JOBS_SHUTDOWN_SECONDS = float(os.getenv("JOBS_SHUTDOWN_SECONDS", "10"))
+JOB_PAGE = 1000
+JOB_IMPORT_CHUNK = 500
+# Progress is written at most this often.
+PROGRESS_SECONDS = 0.5
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+logger = logging.getLogger("zomato.jobs")
+
+_processes = None
+
+
+def _process_pool():
+    global _processes
+    if _processes is None:
+        _processes = ProcessPoolExecutor(max_workers=JOBS_PROCESS_WORKERS)
+    return _processes
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    def __init__(self, job_id: int):
+        self.id = job_id
+        # None, "cancel" or "requeue" (shutdown); acted on at the next report.
+        self.stop = None
+        self._reported = 0.0
+
+    async def progress(self, fraction: float, message: str = None, force: bool = False):
+        # Raises JobCancelled once the job has been told to stop.
+        if self.stop:
+            raise JobCancelled()
+        now = asyncio.get_running_loop().time()
+        if not force and now - self._reported < PROGRESS_SECONDS:
+            return
+        self._reported = now
+        if await asyncio.shield(self._report(fraction, message)) and not self.stop:
+            self.stop = "cancel"
+        if self.stop:
+            raise JobCancelled()
+
+    async def _report(self, fraction: float, message: str) -> bool:
+        async with async_session() as db:
+            q = await db.execute(
+                update(Job)
+                .where(Job.id == self.id)
+                .values(progress=min(fraction, 1.0), message=message, heartbeat_at=func.now())
+                .returning(Job.cancel_requested)
+            )
+            cancel = q.scalar()
+            await db.commit()
+        return cancel
+
+    async def cpu(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(_process_pool(), fn, *args)
+
+
+# CPU-heavy steps. They run in the process pool, so they take and return
+# plain picklable values.
+
+def _encode_ndjson(keys, rows) -> bytes:
+    return "".join(json.dumps(dict(zip(keys, row)), default=str) + "\n" for row in rows).encode()
+
+
+def _cuisine_stats(rows) -> dict:
+    # cuisine -> [restaurants, active, rating sum, min rating, max rating]
+    stats = {}
+    for cuisine, rating, is_active in rows:
+        s = stats.get(cuisine)
+        if s is None:
+            stats[cuisine] = [1, int(is_active), rating, rating, rating]
+        else:
+            s[0] += 1
+            s[1] += int(is_active)
+            s[2] += rating
+            s[3] = min(s[3], rating)
+            s[4] = max(s[4], rating)
+    return stats
+
+
+def _validate_import(path: str):
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        return RestaurantCreateList.validate_json(raw)
+    except ValidationError as e:
+        # ValidationError doesn't survive the trip back from the pool.
+        raise ValueError(f"invalid import: {e.error_count()} errors, first: {e.errors(include_url=False)[0]}")
+
+
+def _read_sessions():
+    # Shard 0 is read through a read-only engine; other shards directly.
+    return [next_read_session()] + shard_sessions[1:]
+
+
+async def _count() -> int:
+    total = 0
+    for factory in _read_sessions():
+        async with factory() as db:
+            total += (await db.execute(select(func.count()).select_from(Restaurant))).scalar()
+    return total
+
+
+async def _pages(columns):
+    # Every restaurant, shard by shard, in id order; one short session per page.
+    for factory in _read_sessions():
+        last = 0
+        while True:
+            async with factory() as db:
+                q = await db.execute(select(Restaurant.id, *columns).where(Restaurant.id > last).order_by(Restaurant.id).limit(JOB_PAGE))
+                rows = q.all()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield [tuple(r)[1:] for r in rows]
+
+
+async def export_job(ctx: JobContext, params: dict) -> dict:
+    columns = list(Restaurant.__table__.columns)
+    keys = [c.name for c in columns]
+    total = await _count()
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    path = os.path.join(JOBS_DIR, f"export-{ctx.id}.ndjson")
+    done = 0
+    try:
+        with open(path, "wb") as out:
+            async for rows in _pages(columns):
+                chunk = await ctx.cpu(_encode_ndjson, keys, rows)
+                await asyncio.to_thread(out.write, chunk)
+                done += len(rows)
+                await ctx.progress(done / max(total, 1), f"{done} of {total} restaurants")
+    except BaseException:
+        # No half-written exports left behind on failure or cancel.
+        await asyncio.shield(asyncio.to_thread(_remove, path))
+        raise
+    return {"path": path, "restaurants": done}
+
+
+async def aggregates_job(ctx: JobContext, params: dict) -> dict:
+    total = await _count()
+    stats = {}
+    done = 0
+    async for rows in _pages([Restaurant.cuisine_type, Restaurant.rating, Restaurant.is_active]):
+        for cuisine, (n, active, rating_sum, low, high) in (await ctx.cpu(_cuisine_stats, rows)).items():
+            s = stats.setdefault(cuisine, [0, 0, 0.0, low, high])
+            s[0] += n
+            s[1] += active
+            s[2] += rating_sum
+            s[3] = min(s[3], low)
+            s[4] = max(s[4], high)
+        done += len(rows)
+        await ctx.progress(done / max(total, 1), f"{done} of {total} restaurants")
+    return {
+        "cuisines": [
+            {"cuisine_type": c, "count": n, "active": active, "avg_rating": round(rating_sum / n, 2), "min_rating": low, "max_rating": high}
+            for c, (n, active, rating_sum, low, high) in sorted(stats.items())
+        ]
+    }
+
+
+async def reindex_job(ctx: JobContext, params: dict) -> dict:
+    # Rebuilds the catalog and everything subscribed to it from the database.
+    await ctx.progress(0.0, "reloading catalog", force=True)
+    await catalog.warm()
+    return {"restaurants": len(catalog.cuisine_by_id)}
+
+
+async def import_job(ctx: JobContext, params: dict) -> dict:
+    # The upload stays until the job is finished; a requeued or taken over
+    # run starts after the rows already committed (params["offset"]).
+    path = params["path"]
+    finished = True
+    try:
+        restaurants = await ctx.cpu(_validate_import, path)
+        imported = params.get("offset", 0)
+        for start in range(imported, len(restaurants), JOB_IMPORT_CHUNK):
+            chunk = restaurants[start:start + JOB_IMPORT_CHUNK]
+            try:
+                # Shielded so a shutdown cancel cannot land between the
+                # commit and the offset that records it.
+                await asyncio.shield(_import_chunk(ctx.id, path, chunk, start + len(chunk)))
+            except IntegrityError:
+                raise ValueError(f"rows {start}-{start + len(chunk) - 1}: name or phone already exists ({imported} imported before)")
+            imported += len(chunk)
+            await ctx.progress(imported / len(restaurants), f"{imported} of {len(restaurants)} imported")
+        return {"imported": imported}
+    except asyncio.CancelledError:
+        finished = False
+        raise
+    except JobCancelled:
+        finished = ctx.stop != "requeue"
+        raise
+    finally:
+        if finished:
+            await asyncio.to_thread(_remove, path)
+
+
+async def _import_chunk(job_id: int, path: str, chunk, offset: int):
+    async with write_repository() as repo:
+        await repo.bulk_create_restaurants(chunk)
+    await _set(job_id, params=json.dumps({"path": path, "offset": offset}))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+JOB_KINDS = {
+    "export": export_job,
+    "aggregates": aggregates_job,
+    "reindex": reindex_job,
+    "import": import_job,
+}
+
+
+class JobRunner:
+    def __init__(self, concurrency: int = JOBS_CONCURRENCY):
+        self.concurrency = concurrency
+        self._wake = asyncio.Event()
+        # Job id -> (context, task) for jobs running in this process.
+        self._running = {}
+
+    def wake(self):
+        self._wake.set()
+
+    def cancel(self, job_id: int):
+        # Cooperative: jobs only stop at a progress report, never halfway
+        # through a write.
+        running = self._running.get(job_id)
+        if running is not None and running[0].stop is None:
+            running[0].stop = "cancel"
+
+    async def run_forever(self):
+        global _processes
+        slots = asyncio.Semaphore(self.concurrency)
+        try:
+            while True:
+                await slots.acquire()
+                self._wake.clear()
+                try:
+                    job = await self._claim()
+                except Exception:
+                    logger.exception("claiming a job failed")
+                    job = None
+                if job is None:
+                    slots.release()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), JOBS_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                ctx = JobContext(job.id)
+                task = asyncio.create_task(self._run(ctx, job.kind, job.params))
+                self._running[job.id] = (ctx, task)
+                task.add_done_callback(lambda t, job_id=job.id: (self._running.pop(job_id, None), slots.release()))
+        finally:
+            for ctx, _ in self._running.values():
+                ctx.stop = ctx.stop or "requeue"
+            tasks = [task for _, task in self._running.values()]
+            if tasks:
+                _, pending = await asyncio.wait(tasks, timeout=JOBS_SHUTDOWN_SECONDS)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            if _processes is not None:
+                _processes.shutdown(wait=False, cancel_futures=True)
+                _processes = None
+
+    async def _claim(self):
+        stale = func.datetime("now", f"-{JOBS_STALE_SECONDS} seconds")
+        candidate = (
+            select(Job.id)
+            .where(or_(Job.status == "queued", and_(Job.status == "running", Job.heartbeat_at < stale)))
+            .order_by(Job.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        async with async_session() as db:
+            q = await db.execute(
+                update(Job)
+                .where(Job.id == candidate)
+                .values(status="running", started_at=func.coalesce(Job.started_at, func.now()), heartbeat_at=func.now())
+                .returning(Job.id, Job.kind, Job.params)
+            )
+            job = q.first()
+            await db.commit()
+        return job
+
+    async def _run(self, ctx: JobContext, kind: str, params):
+        # Status writes are shielded so a shutdown cancel cannot cut them off.
+        try:
+            result = await JOB_KINDS[kind](ctx, json.loads(params) if params else {})
+        except asyncio.CancelledError:
+            # Still running at the end of the shutdown grace period.
+            await asyncio.shield(_requeue(ctx.id))
+            raise
+        except JobCancelled:
+            if ctx.stop == "requeue":
+                await asyncio.shield(_requeue(ctx.id))
+            else:
+                await asyncio.shield(_set(ctx.id, status="cancelled", finished_at=func.now()))
+        except Exception as e:
+            logger.exception("job %d (%s) failed", ctx.id, kind)
+            await asyncio.shield(_set(ctx.id, status="failed", error=str(e) or repr(e), finished_at=func.now()))
+        else:
+            await asyncio.shield(_set(ctx.id, status="succeeded", progress=1.0, result=json.dumps(result), finished_at=func.now()))
+
+
+async def _requeue(job_id: int):
+    # Put back for the next worker; it starts the job over (an import
+    # resumes from its saved offset).
+    await _set(job_id, status="queued", progress=0.0, heartbeat_at=None, message="requeued at shutdown")
+
+
+async def _set(job_id: int, **values):
+    async with async_session() as db:
+        await db.execute(update(Job).where(Job.id == job_id).values(**values))
+        await db.commit()
+
+
+runner = JobRunner()
+
+
+def job_out(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "cancel_requested": job.cancel_requested,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+async def submit(kind: str, params: dict = None) -> Job:
+    async with async_session() as db:
+        job = Job(kind=kind, status="queued", params=json.dumps(params) if params else None)
+        db.add(job)
+        await db.commit()
+    runner.wake()
+    return job
+
+
+async def _get_job(job_id: int) -> Job:
+    async with async_session() as db:
+        job = await db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+router = APIRouter(prefix="/jobs", tags=["jobs"], dependencies=[Depends(admit)])
+
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def create_job_endpoint(body: JobCreate):
+    return job_out(await submit(body.kind))
+
+
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED)
+async def import_job_endpoint(request: Request):
+    # Body: a JSON array of restaurants, as for POST /restaurants/bulk. It is
+    # stored as is and validated by the job.
+    body = await request.body()
+    if not body:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Empty import")
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    path = os.path.join(JOBS_DIR, f"import-{os.urandom(8).hex()}.json")
+    with open(path, "wb") as f:
+        await asyncio.to_thread(f.write, body)
+    return job_out(await submit("import", {"path": path}))
+
+
+@router.get("/")
+async def list_jobs_endpoint(status_: str = Query(None, alias="status"), limit: int = Query(20, ge=1, le=100)):
+    query = select(Job).order_by(Job.id.desc()).limit(limit)
+    if status_ is not None:
+        query = query.where(Job.status == status_)
+    async with async_session() as db:
+        jobs = (await db.execute(query)).scalars().all()
+    return [job_out(job) for job in jobs]
+
+
+@router.get("/{job_id}")
+async def get_job_endpoint(job_id: int):
+    return job_out(await _get_job(job_id))
+
+
+@router.post("/{job_id}/cancel", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_job_endpoint(job_id: int):
+    job = await _get_job(job_id)
+    if job.status in FINISHED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {job.status}")
+    async with async_session() as db:
+        # A queued job is cancelled outright; a running one stops at its
+        # next progress report.
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status.not_in(FINISHED))
+            .values(cancel_requested=True)
+        )
+        await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="cancelled", finished_at=func.now())
+        )
+        await db.commit()
+    runner.cancel(job_id)
+    return job_out(await _get_job(job_id))
+
+
+@router.get("/{job_id}/download")
+async def download_job_endpoint(job_id: int):
+    job = await _get_job(job_id)
+    if job.kind != "export" or job.status != "succeeded":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Only finished exports can be downloaded")
+    path = json.loads(job.result)["path"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export file is gone")
+    return FileResponse(path, media_type="application/x-ndjson", filename=os.path.basename(path))
@@ -1,25 +1,117 @@
-from fastapi import FastAPI
-from database import engine, Base
-import models
-from routes import router as restaurants_router
+import time
 
-app = FastAPI(title="Zomato V1 - Restaurant Management")
+# Time-to-ready is counted from here, so it includes importing the app.
+BOOT_STARTED = time.perf_counter()
 
-app.include_router(restaurants_router)
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 
+from fastapi import FastAPI, Response
+import migrations
+import profiling
+from archive import ARCHIVE_AFTER_DAYS, archive_forever
+from cache import CATALOG_REFRESH_SECONDS, SNAPSHOT_SECONDS, catalog
+from database import dispose_engines
+from jobs import router as jobs_router, runner as job_runner
+from repository import REPOSITORY_BACKEND
+from routes import changes_router, router as restaurants_router
 
-@app.get("/")
-async def root():
-    return {"message": "Welcome to Zomato V1 - Restaurant Management API"}
+# Production runs `python migrations.py` before deploy and sets AUTO_MIGRATE=0,
+# so worker startup is a single PRAGMA read.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") == "1"
+# A warning is logged when a worker takes longer than this to become ready.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+
+logger = logging.getLogger("zomato.startup")
 
 
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    version = await migrations.get_version()
+    if version >= migrations.LATEST_VERSION:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"database schema is at version {version}, expected {migrations.LATEST_VERSION}; "
+            "run `python migrations.py` first"
+        )
+    await migrations.upgrade()
+
+
+_background = []
+# Seconds from BOOT_STARTED until the catalog was loaded; None until then.
+ready_after = None
+# The catalog load in progress. Shutdown waits for it rather than cancelling
+# it halfway through a query.
+_warming = None
+
+
+async def warm_catalog():
+    # Runs once the worker is already accepting connections; /ready answers
+    # 503 until it is done, so the balancer only routes to warm workers.
+    global ready_after, _warming
+    while True:
+        _warming = asyncio.create_task(catalog.warm())
+        try:
+            await asyncio.shield(_warming)
+            break
+        except Exception:
+            logger.exception("loading the catalog failed, retrying")
+            await asyncio.sleep(CATALOG_REFRESH_SECONDS)
+    ready_after = time.perf_counter() - BOOT_STARTED
+    log = logger.warning if ready_after > STARTUP_BUDGET_SECONDS else logger.info
+    log("ready after %.2fs (budget %.2fs)", ready_after, STARTUP_BUDGET_SECONDS)
+    _background.append(asyncio.create_task(catalog.refresh_forever()))
+    if catalog.snapshots_enabled:
+        _background.append(asyncio.create_task(catalog.snapshot_forever()))
 
 
-@app.on_event("startup")
-async def on_startup():
-    await init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The in-memory backend never touches the database.
+    if REPOSITORY_BACKEND != "memory":
+        await init_db()
+    watchdog = profiling.LoopWatchdog(asyncio.get_running_loop()).start() if profiling.ENABLED else None
+    catalog.snapshots_enabled = SNAPSHOT_SECONDS > 0 and REPOSITORY_BACKEND == "sqlalchemy"
+    _background.append(asyncio.create_task(warm_catalog()))
+    if ARCHIVE_AFTER_DAYS > 0 and REPOSITORY_BACKEND != "memory":
+        _background.append(asyncio.create_task(archive_forever()))
+    if REPOSITORY_BACKEND != "memory":
+        _background.append(asyncio.create_task(job_runner.run_forever()))
+    yield
+    if _warming is not None:
+        await asyncio.gather(_warming, return_exceptions=True)
+    for task in _background:
+        task.cancel()
+    await asyncio.gather(*_background, return_exceptions=True)
+    _background.clear()
+    if watchdog is not None:
+        watchdog.stop()
+    await dispose_engines()
+
+
+app = FastAPI(title="Zomato V1 - Restaurant Management", lifespan=lifespan)
+
+# Jobs and the change feed work on the database, so the in-memory backend
+# has neither. The feed goes first: /restaurants/{id} would claim its paths.
+if REPOSITORY_BACKEND != "memory":
+    app.include_router(changes_router)
+    app.include_router(jobs_router)
+app.include_router(restaurants_router)
+if profiling.ENABLED:
+    profiling.install(app)
+
+
+@app.get("/")
+async def root():
+    return {"message": "Welcome to Zomato V1 - Restaurant Management API"}
 
 
+@app.get("/ready")
+async def ready(response: Response):
+    # Readiness probe; "/" stays the liveness check.
+    if ready_after is None:
+        response.status_code = 503
+        return {"ready": False}
+    return {"ready": True, "seconds": round(ready_after, 3)}
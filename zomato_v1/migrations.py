@@ -0,0 +1,242 @@
+import asyncio
+import sys
+
+from database import dispose_engines, shard_sessions
+
+# Versioned schema migrations, tracked in SQLite's PRAGMA user_version.
+# Append new steps to MIGRATIONS; never edit one that has already shipped.
+# Every step must be safe to re-run (IF NOT EXISTS etc.) so a crash midway
+# can simply be retried.
+
+
+def _baseline(conn):
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS restaurants (
+            id INTEGER NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            cuisine_type VARCHAR(50) NOT NULL,
+            address TEXT NOT NULL,
+            phone_number VARCHAR(20) NOT NULL,
+            rating FLOAT NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            opening_time TIME,
+            closing_time TIME,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (id),
+            UNIQUE (phone_number)
+        )
+        """
+    )
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_restaurants_name ON restaurants (name)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_restaurants_cuisine_type ON restaurants (cuisine_type)")
+
+
+def _listing_indexes(conn):
+    # WAL lets readers keep going while an index is being built.
+    conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_restaurants_is_active_id ON restaurants (is_active, id)")
+    # id is the rowid; a separate index on it only costs writes.
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_restaurants_id")
+
+
+def _change_outbox(conn):
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS restaurant_changes (
+            seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            restaurant_id INTEGER NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            data TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )
+        """
+    )
+
+
+def _city_column(conn):
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(restaurants)")}
+    if "city" not in columns:
+        conn.exec_driver_sql("ALTER TABLE restaurants ADD COLUMN city VARCHAR(50)")
+
+
+def _archive_tier(conn):
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(restaurants)")}
+    if "deactivated_at" not in columns:
+        conn.exec_driver_sql("ALTER TABLE restaurants ADD COLUMN deactivated_at DATETIME")
+    conn.exec_driver_sql(
+        "UPDATE restaurants SET deactivated_at = coalesce(updated_at, created_at) "
+        "WHERE is_active = 0 AND deactivated_at IS NULL"
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS restaurants_archive (
+            id INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            cuisine_type VARCHAR(50) NOT NULL,
+            address TEXT NOT NULL,
+            phone_number VARCHAR(20) NOT NULL,
+            city VARCHAR(50),
+            rating FLOAT NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            opening_time TIME,
+            closing_time TIME,
+            created_at DATETIME NOT NULL,
+            updated_at DATETIME,
+            deactivated_at DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL
+        )
+        """
+    )
+    # Listings only want active rows; archive candidates only inactive ones.
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_restaurants_active_id ON restaurants (is_active, id) WHERE is_active = 1")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_restaurants_inactive_deactivated_at ON restaurants (deactivated_at) WHERE is_active = 0"
+    )
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_restaurants_is_active_id")
+
+
+def _jobs_table(conn):
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER NOT NULL PRIMARY KEY,
+            kind VARCHAR(20) NOT NULL,
+            status VARCHAR(10) NOT NULL,
+            params TEXT,
+            progress FLOAT NOT NULL,
+            message TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested BOOLEAN NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            started_at DATETIME,
+            heartbeat_at DATETIME,
+            finished_at DATETIME
+        )
+        """
+    )
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_jobs_status_id ON jobs (status, id)")
+
+
+def _autoincrement_ids(conn):
+    # Archiving the highest id used to free it for the next INSERT, so one id
+    # could name two restaurants. AUTOINCREMENT never hands an id out twice;
+    # SQLite can only add it by rebuilding the table. The sequence starts
+    # above every archived id as well.
+    sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'restaurants'").scalar()
+    if "AUTOINCREMENT" not in sql.upper():
+        conn.exec_driver_sql("DROP TABLE IF EXISTS restaurants_rebuild")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE restaurants_rebuild (
+                id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                name VARCHAR(100) NOT NULL,
+                description TEXT,
+                cuisine_type VARCHAR(50) NOT NULL,
+                address TEXT NOT NULL,
+                phone_number VARCHAR(20) NOT NULL,
+                rating FLOAT NOT NULL,
+                is_active BOOLEAN NOT NULL,
+                opening_time TIME,
+                closing_time TIME,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+                updated_at DATETIME,
+                city VARCHAR(50),
+                deactivated_at DATETIME,
+                UNIQUE (phone_number)
+            )
+            """
+        )
+        columns = (
+            "id, name, description, cuisine_type, address, phone_number, rating, is_active, "
+            "opening_time, closing_time, created_at, updated_at, city, deactivated_at"
+        )
+        conn.exec_driver_sql(f"INSERT INTO restaurants_rebuild ({columns}) SELECT {columns} FROM restaurants")
+        conn.exec_driver_sql("DROP TABLE restaurants")
+        conn.exec_driver_sql("ALTER TABLE restaurants_rebuild RENAME TO restaurants")
+        conn.exec_driver_sql("CREATE UNIQUE INDEX ix_restaurants_name ON restaurants (name)")
+        conn.exec_driver_sql("CREATE INDEX ix_restaurants_cuisine_type ON restaurants (cuisine_type)")
+        conn.exec_driver_sql("CREATE INDEX ix_restaurants_active_id ON restaurants (is_active, id) WHERE is_active = 1")
+        conn.exec_driver_sql(
+            "CREATE INDEX ix_restaurants_inactive_deactivated_at ON restaurants (deactivated_at) WHERE is_active = 0"
+        )
+    top = conn.exec_driver_sql(
+        "SELECT max(coalesce((SELECT max(id) FROM restaurants), 0), coalesce((SELECT max(id) FROM restaurants_archive), 0))"
+    ).scalar()
+    if conn.exec_driver_sql("SELECT 1 FROM sqlite_sequence WHERE name = 'restaurants'").scalar() is None:
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('restaurants', 0)")
+    conn.exec_driver_sql(f"UPDATE sqlite_sequence SET seq = max(seq, {int(top)}) WHERE name = 'restaurants'")
+
+
+MIGRATIONS = [
+    (1, "baseline restaurants table", _baseline),
+    (2, "WAL and listing indexes", _listing_indexes),
+    (3, "restaurant change outbox", _change_outbox),
+    (4, "city shard key", _city_column),
+    (5, "restaurant archive tier", _archive_tier),
+    (6, "background jobs", _jobs_table),
+    (7, "never reuse restaurant ids", _autoincrement_ids),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _upgrade(conn):
+    applied = []
+    current = current_version(conn)
+    for version, _, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+        applied.append(version)
+    if applied:
+        conn.exec_driver_sql("ANALYZE")
+    conn.exec_driver_sql("PRAGMA optimize")
+    return applied
+
+
+# Every shard database carries the same schema; shard 0 is the primary.
+async def get_version() -> int:
+    versions = []
+    for factory in shard_sessions:
+        async with factory.engine.connect() as conn:
+            versions.append(await conn.run_sync(current_version))
+    return min(versions)
+
+
+async def upgrade():
+    applied = []
+    for factory in shard_sessions:
+        async with factory.engine.begin() as conn:
+            applied = await conn.run_sync(_upgrade) or applied
+    return applied
+
+
+async def main(argv):
+    command = argv[1] if len(argv) > 1 else "upgrade"
+    if command == "current":
+        print(f"schema version {await get_version()} (latest {LATEST_VERSION})")
+    elif command == "upgrade":
+        applied = await upgrade()
+        if applied:
+            print(f"applied migrations {applied}, now at version {LATEST_VERSION}")
+        else:
+            print(f"already at version {LATEST_VERSION}")
+    else:
+        print("usage: python migrations.py [upgrade|current]")
+        return 2
+    await dispose_engines()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv)))
@@ -1,19 +1,86 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, Time, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, Time, DateTime, Index, func, text
 from database import Base
 
 class Restaurant(Base):
     __tablename__ = "restaurants"
+    __table_args__ = (
+        Index("ix_restaurants_active_id", "is_active", "id", sqlite_where=text("is_active = 1")),
+        Index("ix_restaurants_inactive_deactivated_at", "deactivated_at", sqlite_where=text("is_active = 0")),
+        # Archived ids must never be handed out again.
+        {"sqlite_autoincrement": True},
+    )
+    # Fetch server-generated timestamps with RETURNING instead of a refresh.
+    __mapper_args__ = {"eager_defaults": True}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String(100), nullable=False, unique=True, index=True)
     description = Column(Text, nullable=True)
     cuisine_type = Column(String(50), nullable=False, index=True)
     address = Column(Text, nullable=False)
     phone_number = Column(String(20), nullable=False, unique=True)
+    # Shard key for REPOSITORY_BACKEND=sharded.
+    city = Column(String(50), nullable=True)
     rating = Column(Float, nullable=False, default=0.0)
     is_active = Column(Boolean, nullable=False, default=True)
     opening_time = Column(Time, nullable=True)
     closing_time = Column(Time, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
+    # Set while is_active is False; the archiver moves rows deactivated for
+    # longer than ARCHIVE_AFTER_DAYS into restaurants_archive.
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
 
+
+class RestaurantArchive(Base):
+    __tablename__ = "restaurants_archive"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    description = Column(Text, nullable=True)
+    cuisine_type = Column(String(50), nullable=False)
+    address = Column(Text, nullable=False)
+    phone_number = Column(String(20), nullable=False)
+    city = Column(String(50), nullable=True)
+    rating = Column(Float, nullable=False)
+    is_active = Column(Boolean, nullable=False)
+    opening_time = Column(Time, nullable=True)
+    closing_time = Column(Time, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class RestaurantChange(Base):
+    __tablename__ = "restaurant_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    restaurant_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)
+    data = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# Background jobs (see jobs.py); only shard 0's table is used.
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_status_id", "status", "id"),)
+    __mapper_args__ = {"eager_defaults": True}
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)
+    # queued, running, succeeded, failed or cancelled.
+    status = Column(String(10), nullable=False, default="queued")
+    params = Column(Text, nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    # Refreshed with every progress report; a running job whose heartbeat
+    # stops (its worker died) is picked up again by another worker.
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, OrderedDict
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse
+
+# Admin-only profiling for live workers. Nothing here is imported into the
+# request path unless ENABLE_PROFILING=1, so a disabled worker pays nothing.
+#
+#   POST /_debug/profile?seconds=N   sample the event loop thread for N
+#                                    seconds, returns collapsed stacks
+#                                    (flamegraph.pl / speedscope input)
+#   X-Profile: 1 request header      sample while that request runs; the
+#                                    response carries X-Profile-Id
+#   GET /_debug/profiles/{id}        fetch a per-request profile
+#
+# A watchdog thread also logs the blocking stack whenever the event loop
+# fails to run a callback within SLOW_CALLBACK_SECONDS.
+
+ENABLED = os.getenv("ENABLE_PROFILING", "0") == "1"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+MAX_PROFILE_SECONDS = 60
+KEEP_PROFILES = 50
+SLOW_CALLBACK_SECONDS = float(os.getenv("SLOW_CALLBACK_SECONDS", "0.1"))
+
+logger = logging.getLogger("zomato.profiling")
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class LoopWatchdog:
+    def __init__(self, loop, threshold: float = SLOW_CALLBACK_SECONDS):
+        self.loop = loop
+        self.threshold = threshold
+        self.loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+
+    def _touch(self):
+        self._beat = time.monotonic()
+
+    def _run(self):
+        reported = False
+        while not self._stop.wait(self.threshold / 2):
+            self.loop.call_soon_threadsafe(self._touch)
+            lag = time.monotonic() - self._beat
+            if lag <= self.threshold:
+                reported = False
+            elif not reported:
+                reported = True
+                frame = sys._current_frames().get(self.loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+                logger.warning("event loop blocked for %.0f ms:\n%s", lag * 1000, stack)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def _is_admin(token) -> bool:
+    # Constant time, so response timing says nothing about the token.
+    return bool(ADMIN_TOKEN) and token is not None and secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def require_admin(x_admin_token: str = Header("")):
+    if not _is_admin(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
+
+
+router = APIRouter(prefix="/_debug", tags=["debug"], dependencies=[Depends(require_admin)])
+_profiles = OrderedDict()
+_profile_ids = itertools.count(1)
+
+
+def _folded(body: str, name: str) -> PlainTextResponse:
+    return PlainTextResponse(body, headers={"Content-Disposition": f'attachment; filename="{name}.folded"'})
+
+
+@router.post("/profile")
+async def profile_endpoint(seconds: float = Query(5, gt=0, le=MAX_PROFILE_SECONDS)):
+    sampler = StackSampler(threading.get_ident()).start()
+    await asyncio.sleep(seconds)
+    return _folded(sampler.stop(), "profile")
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile_endpoint(profile_id: int):
+    body = _profiles.get(profile_id)
+    if body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return _folded(body, f"request-{profile_id}")
+
+
+async def profile_request_middleware(request: Request, call_next):
+    if request.headers.get("X-Profile") != "1" or not _is_admin(request.headers.get("X-Admin-Token")):
+        return await call_next(request)
+    # Samples the whole loop thread, so concurrent requests show up too.
+    sampler = StackSampler(threading.get_ident()).start()
+    try:
+        response = await call_next(request)
+    finally:
+        body = sampler.stop()
+    profile_id = next(_profile_ids)
+    _profiles[profile_id] = body
+    if len(_profiles) > KEEP_PROFILES:
+        _profiles.popitem(last=False)
+    response.headers["X-Profile-Id"] = str(profile_id)
+    return response
+
+
+def install(app):
+    # The loop watchdog is started by the app's lifespan (see main.py).
+    app.include_router(router)
+    app.middleware("http")(profile_request_middleware)
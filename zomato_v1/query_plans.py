@@ -0,0 +1,193 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Query-plan regression check for every CRUD query.
+#
+#   python query_plans.py            check against query_plans.json
+#   python query_plans.py --update   rewrite query_plans.json
+#   python -m unittest query_plans   same check as a test
+#
+# Each CRUD function runs against a seeded throwaway database; every SQL
+# statement it emits is captured and run through EXPLAIN QUERY PLAN. A check
+# fails when a statement scans the restaurants table outside FULL_SCAN_OK, or
+# when a plan no longer matches the committed baseline.
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / "query_plans.json"
+TEST_CRUD = HERE.parent / "test" / "zomato_v1" / "crud.py"
+SEED_ROWS = 2000
+CUISINES = ["Indian", "Italian", "Chinese", "Mexican", "Thai", "Japanese", "French", "Greek"]
+
+# Cases whose restaurants scan is expected, with the reason.
+FULL_SCAN_OK = {
+    "zomato_v1.list_restaurants": "walks the rowid in order and stops at LIMIT",
+    "zomato_v1.list_restaurants.fields": "walks the rowid in order and stops at LIMIT",
+    "zomato_v1.search_by_cuisine": "ILIKE '%x%' cannot use an index",
+    "test.get_restaurants": "unfiltered count and rowid-order page",
+    "test.search_restaurants_by_cuisine": "ILIKE '%x%' cannot use an index",
+}
+
+
+def _setup_modules(db_path: str):
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("READ_ENGINES", "1")
+    sys.path.insert(0, str(HERE))
+    import crud
+    import database
+    import migrations
+
+    spec = importlib.util.spec_from_file_location("test_zomato_crud", TEST_CRUD)
+    test_crud = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(test_crud)
+    return crud, database, migrations, test_crud.restaurant_crud
+
+
+def _new_restaurant(schemas, i: int):
+    return schemas.RestaurantCreate(
+        name=f"Plan Restaurant {i}",
+        description="seeded for query plan checks",
+        cuisine_type=CUISINES[i % len(CUISINES)],
+        address=f"{i} Plan Street",
+        phone_number=f"+9180{i:08d}",
+        rating=(i % 50) / 10,
+        is_active=i % 5 != 0,
+    )
+
+
+def _cases(crud, test_crud, schemas):
+    from schemas import RestaurantFilter, RestaurantUpdate
+
+    return [
+        ("zomato_v1.create_restaurant", lambda db: crud.create_restaurant(db, _new_restaurant(schemas, SEED_ROWS + 1))),
+        ("zomato_v1.bulk_create_restaurants", lambda db: crud.bulk_create_restaurants(db, [_new_restaurant(schemas, SEED_ROWS + 2)])),
+        ("zomato_v1.get_restaurant", lambda db: crud.get_restaurant(db, 42)),
+        ("zomato_v1.get_restaurants_by_ids", lambda db: crud.get_restaurants_by_ids(db, [42, 7, 1999])),
+        ("zomato_v1.get_restaurant_by_name", lambda db: crud.get_restaurant_by_name(db, "Plan Restaurant 41")),
+        ("zomato_v1.count_restaurants", lambda db: crud.count_restaurants(db, active_only=True)),
+        ("zomato_v1.list_restaurants", lambda db: crud.list_restaurants(db, skip=20, limit=10)),
+        ("zomato_v1.list_restaurants.fields", lambda db: crud.list_restaurants(db, skip=20, limit=10, fields=("name", "rating", "id"))),
+        ("zomato_v1.list_active_restaurants", lambda db: crud.list_active_restaurants(db, skip=20, limit=10)),
+        ("zomato_v1.search_by_cuisine", lambda db: crud.search_by_cuisine(db, "ital", skip=0, limit=10)),
+        ("zomato_v1.update_restaurant", lambda db: crud.update_restaurant(db, 43, RestaurantUpdate(rating=4.9))),
+        ("zomato_v1.delete_restaurant", lambda db: crud.delete_restaurant(db, 44)),
+        ("zomato_v1.batch_update_restaurants.ids", lambda db: crud.batch_update_restaurants(db, [45, 46], None, {"is_active": False})),
+        ("zomato_v1.batch_update_restaurants.filter", lambda db: crud.batch_update_restaurants(db, None, RestaurantFilter(cuisine_type="Thai"), {"rating": 3.0})),
+        ("zomato_v1.archive_inactive_restaurants", lambda db: crud.archive_inactive_restaurants(db, datetime.now(timezone.utc), 10)),
+        ("zomato_v1.batch_delete_restaurants", lambda db: crud.batch_delete_restaurants(db, [47, 48], None)),
+        ("test.get_restaurant", lambda db: test_crud.get_restaurant(db, 50)),
+        ("test.get_restaurant_by_name", lambda db: test_crud.get_restaurant_by_name(db, "Plan Restaurant 51")),
+        ("test.get_restaurants", lambda db: test_crud.get_restaurants(db, skip=0, limit=10)),
+        ("test.get_active_restaurants", lambda db: test_crud.get_active_restaurants(db, skip=0, limit=10)),
+        ("test.search_restaurants_by_cuisine", lambda db: test_crud.search_restaurants_by_cuisine(db, "ital", skip=0, limit=10)),
+        ("test.update_restaurant", lambda db: test_crud.update_restaurant(db, 52, RestaurantUpdate(rating=1.5))),
+        ("test.delete_restaurant", lambda db: test_crud.delete_restaurant(db, 53)),
+    ]
+
+
+def _explain(db_path: str, captured):
+    conn = sqlite3.connect(db_path)
+    try:
+        plans = {}
+        for case, statement, params in captured:
+            if not statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE")):
+                continue
+            if isinstance(params, list):
+                params = params[0] if params else ()
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", params).fetchall()
+            entry = {"sql": " ".join(statement.split()), "plan": [row[3] for row in rows]}
+            if entry not in plans.setdefault(case, []):
+                plans[case].append(entry)
+        return plans
+    finally:
+        conn.close()
+
+
+async def _collect(db_path: str):
+    crud, database, migrations, test_crud = _setup_modules(db_path)
+    import schemas
+    from sqlalchemy import event
+
+    await migrations.upgrade()
+    async with database.async_session() as db:
+        await crud.bulk_create_restaurants(db, [_new_restaurant(schemas, i) for i in range(1, SEED_ROWS + 1)])
+    engine = database.async_session.engine
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    captured = []
+    current = {}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((current["case"], statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    for name, run in _cases(crud, test_crud, schemas):
+        current["case"] = name
+        async with database.async_session() as db:
+            await run(db)
+    event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    await database.dispose_engines()
+    return captured
+
+
+def collect_plans():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plans.db")
+        captured = asyncio.run(_collect(db_path))
+        return _explain(db_path, captured)
+
+
+def find_problems(plans, baseline):
+    problems = []
+    for case, entries in plans.items():
+        for entry in entries:
+            scans = [line for line in entry["plan"] if line.startswith("SCAN restaurants")]
+            if scans and case not in FULL_SCAN_OK:
+                problems.append(f"{case}: unexpected {scans[0]!r} for {entry['sql']}")
+        if case not in baseline:
+            problems.append(f"{case}: no baseline plan, run with --update")
+        elif baseline[case] != entries:
+            problems.append(f"{case}: plan changed from baseline, run with --update and review the diff")
+    for case in baseline.keys() - plans.keys():
+        problems.append(f"{case}: in baseline but no longer captured")
+    return problems
+
+
+def load_baseline():
+    if not BASELINE.exists():
+        return {}
+    return json.loads(BASELINE.read_text())
+
+
+class QueryPlanTest(unittest.TestCase):
+    def test_plans_match_baseline(self):
+        problems = find_problems(collect_plans(), load_baseline())
+        self.assertEqual(problems, [], "\n".join(problems))
+
+
+def main(argv):
+    plans = collect_plans()
+    if "--update" in argv:
+        BASELINE.write_text(json.dumps(plans, indent=2, sort_keys=True) + "\n")
+        print(f"wrote {len(plans)} cases to {BASELINE.name}")
+        plans_baseline = plans
+    else:
+        plans_baseline = load_baseline()
+    problems = find_problems(plans, plans_baseline)
+    for problem in problems:
+        print(problem)
+    if not problems:
+        print(f"{len(plans)} cases OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,513 @@
+import asyncio
+import heapq
+import os
+import zlib
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+from admission import db_sessions
+from cache import catalog
+from database import async_session, get_db, get_read_db, mark_wrote, next_read_session, shard_sessions
+from schemas import RestaurantCreate, RestaurantFilter, RestaurantUpdate
+
+# "sqlalchemy" (default), "sharded" or "memory". The memory backend keeps the
+# catalog in this process only; use it for tests and throwaway preview
+# deployments. "sharded" spreads restaurants over SHARD_URLS by city.
+REPOSITORY_BACKEND = os.getenv("REPOSITORY_BACKEND", "sqlalchemy")
+
+
+class RestaurantRepository(ABC):
+    # Operations of test/zomato_v1/crud.RestaurantCRUD, bound to a backend
+    # instead of taking a session on every call. A backend missing one of
+    # them fails when it is instantiated.
+    @abstractmethod
+    async def create_restaurant(self, restaurant: RestaurantCreate):
+        ...
+
+    @abstractmethod
+    async def get_restaurant(self, restaurant_id: int):
+        ...
+
+    @abstractmethod
+    async def get_restaurant_by_name(self, name: str):
+        ...
+
+    # fields narrows the columns read to that tuple (see crud.Fields);
+    # backends may return more, the route drops the extras.
+    @abstractmethod
+    async def get_restaurants_by_ids(self, ids: List[int], fields=None) -> Dict:
+        # id -> row for the ids that exist.
+        ...
+
+    @abstractmethod
+    async def list_restaurants(self, skip: int = 0, limit: int = 100, cuisine_type: Optional[str] = None, active_only: bool = False, fields=None) -> List:
+        ...
+
+    @abstractmethod
+    async def count_restaurants(self, cuisine_type: Optional[str] = None, active_only: bool = False) -> int:
+        ...
+
+    @abstractmethod
+    async def update_restaurant(self, restaurant_id: int, restaurant_update: RestaurantUpdate):
+        ...
+
+    @abstractmethod
+    async def delete_restaurant(self, restaurant_id: int) -> bool:
+        ...
+
+    # Batch writes: all or nothing, and the outcomes are id -> status as in
+    # crud.batch_outcomes.
+    @abstractmethod
+    async def bulk_create_restaurants(self, restaurants: List[RestaurantCreate]) -> List[int]:
+        ...
+
+    @abstractmethod
+    async def batch_update_restaurants(self, ids: Optional[List[int]], filter: Optional[RestaurantFilter], changes: dict) -> Dict[int, str]:
+        ...
+
+    @abstractmethod
+    async def batch_delete_restaurants(self, ids: Optional[List[int]], filter: Optional[RestaurantFilter]) -> Dict[int, str]:
+        ...
+
+    async def get_restaurants(self, skip: int = 0, limit: int = 100, cuisine_type: Optional[str] = None, active_only: bool = False) -> Tuple[List, int]:
+        rows = await self.list_restaurants(skip, limit, cuisine_type, active_only)
+        return rows, await self.count_restaurants(cuisine_type, active_only)
+
+    async def search_restaurants_by_cuisine(self, cuisine_type: str, skip: int = 0, limit: int = 100) -> Tuple[List, int]:
+        return await self.get_restaurants(skip, limit, cuisine_type=cuisine_type)
+
+    async def get_active_restaurants(self, skip: int = 0, limit: int = 100) -> Tuple[List, int]:
+        return await self.get_restaurants(skip, limit, active_only=True)
+
+
+class SqlAlchemyRestaurantRepository(RestaurantRepository):
+    # shard is (index, count) when db is one shard of several.
+    def __init__(self, db: AsyncSession, shard: Optional[Tuple[int, int]] = None):
+        self.db = db
+        self.shard = shard
+
+    async def create_restaurant(self, restaurant):
+        return await crud.create_restaurant(self.db, restaurant, shard=self.shard)
+
+    async def get_restaurant(self, restaurant_id):
+        return await crud.get_restaurant(self.db, restaurant_id)
+
+    async def get_restaurant_by_name(self, name):
+        return await crud.get_restaurant_by_name(self.db, name)
+
+    async def get_restaurants_by_ids(self, ids, fields=None):
+        return await crud.get_restaurants_by_ids(self.db, ids, fields)
+
+    async def list_restaurants(self, skip=0, limit=100, cuisine_type=None, active_only=False, fields=None):
+        if cuisine_type:
+            return await crud.search_by_cuisine(self.db, cuisine_type, skip=skip, limit=limit, active_only=active_only, fields=fields)
+        if active_only:
+            return await crud.list_active_restaurants(self.db, skip=skip, limit=limit, fields=fields)
+        return await crud.list_restaurants(self.db, skip=skip, limit=limit, fields=fields)
+
+    async def count_restaurants(self, cuisine_type=None, active_only=False):
+        return await crud.count_restaurants(self.db, cuisine_type, active_only)
+
+    async def update_restaurant(self, restaurant_id, restaurant_update):
+        return await crud.update_restaurant(self.db, restaurant_id, restaurant_update)
+
+    async def delete_restaurant(self, restaurant_id):
+        return await crud.delete_restaurant(self.db, restaurant_id)
+
+    async def bulk_create_restaurants(self, restaurants):
+        return await crud.bulk_create_restaurants(self.db, restaurants, shard=self.shard)
+
+    async def batch_update_restaurants(self, ids, filter, changes):
+        return await crud.batch_update_restaurants(self.db, ids, filter, changes)
+
+    async def batch_delete_restaurants(self, ids, filter):
+        return await crud.batch_delete_restaurants(self.db, ids, filter)
+
+
+class ShardedRestaurantRepository(RestaurantRepository):
+    # One database per shard. A restaurant is placed by its city and its id
+    # encodes the shard (id % shard count), so single-row calls touch one
+    # database and writes to different shards never share a lock. Listings
+    # run on every shard at once and are merged in id order.
+    #
+    # A row stays on the shard it was created on if its city changes later.
+    # Each shard only enforces name and phone_number uniqueness for its own
+    # rows, so writes that set them check every shard first, one at a time
+    # per worker. Start from empty shards: rows created before sharding
+    # don't follow the id scheme.
+    def __init__(self, sessions=shard_sessions):
+        self.sessions = sessions
+        self._unique_writes = asyncio.Lock()
+
+    def shard_for_city(self, city: Optional[str]) -> int:
+        return zlib.crc32((city or "").strip().lower().encode()) % len(self.sessions)
+
+    async def _on(self, shard: int, call):
+        async with self.sessions[shard]() as db:
+            return await call(SqlAlchemyRestaurantRepository(db, (shard, len(self.sessions))))
+
+    async def _on_all(self, call):
+        return await asyncio.gather(*(self._on(shard, call) for shard in range(len(self.sessions))))
+
+    async def _on_owner(self, restaurant_id: int, call):
+        return await self._on(restaurant_id % len(self.sessions), call)
+
+    async def _check_unique(self, names, phones, exclude_id=None):
+        # Raises the IntegrityError a single database would for a name or
+        # phone that is taken on any shard, or repeated within the request.
+        for column, values in (("name", names), ("phone_number", phones)):
+            if len(set(values)) < len(values):
+                raise _duplicate(column)
+        found = await self._on_all(lambda repo: crud.find_duplicate(repo.db, names, phones, exclude_id))
+        column = next((column for column in found if column), None)
+        if column is not None:
+            raise _duplicate(column)
+
+    async def create_restaurant(self, restaurant):
+        async with self._unique_writes:
+            await self._check_unique([restaurant.name], [restaurant.phone_number])
+            return await self._on(self.shard_for_city(restaurant.city), lambda repo: repo.create_restaurant(restaurant))
+
+    async def get_restaurant(self, restaurant_id):
+        return await self._on_owner(restaurant_id, lambda repo: repo.get_restaurant(restaurant_id))
+
+    async def get_restaurant_by_name(self, name):
+        rows = await self._on_all(lambda repo: repo.get_restaurant_by_name(name))
+        return next((row for row in rows if row is not None), None)
+
+    async def get_restaurants_by_ids(self, ids, fields=None):
+        by_shard = defaultdict(list)
+        for restaurant_id in ids:
+            by_shard[restaurant_id % len(self.sessions)].append(restaurant_id)
+        found = {}
+        for part in await asyncio.gather(*(
+            self._on(shard, lambda repo, shard_ids=shard_ids: repo.get_restaurants_by_ids(shard_ids, fields))
+            for shard, shard_ids in by_shard.items()
+        )):
+            found.update(part)
+        return found
+
+    async def list_restaurants(self, skip=0, limit=100, cuisine_type=None, active_only=False, fields=None):
+        # Any shard could hold every row of the page, so each returns its
+        # first skip + limit rows.
+        pages = await self._on_all(lambda repo: repo.list_restaurants(0, skip + limit, cuisine_type, active_only, fields))
+        return list(islice(heapq.merge(*pages, key=itemgetter("id")), skip, skip + limit))
+
+    async def count_restaurants(self, cuisine_type=None, active_only=False):
+        return sum(await self._on_all(lambda repo: repo.count_restaurants(cuisine_type, active_only)))
+
+    async def update_restaurant(self, restaurant_id, restaurant_update):
+        names = [restaurant_update.name] if restaurant_update.name is not None else []
+        phones = [restaurant_update.phone_number] if restaurant_update.phone_number is not None else []
+        if not names and not phones:
+            return await self._on_owner(restaurant_id, lambda repo: repo.update_restaurant(restaurant_id, restaurant_update))
+        async with self._unique_writes:
+            if await self.get_restaurant(restaurant_id) is None:
+                return None
+            await self._check_unique(names, phones, exclude_id=restaurant_id)
+            return await self._on_owner(restaurant_id, lambda repo: repo.update_restaurant(restaurant_id, restaurant_update))
+
+    async def delete_restaurant(self, restaurant_id):
+        return await self._on_owner(restaurant_id, lambda repo: repo.delete_restaurant(restaurant_id))
+
+    async def _stage_on(self, shards, stage):
+        # Runs stage(shard, db) on each shard without committing, then
+        # commits them all, so a conflict on one shard leaves every shard
+        # unchanged. Shards are locked in index order, the same in every
+        # call, so two batches can't each hold a lock the other waits for.
+        # Returns {shard: staged}.
+        async with AsyncExitStack() as stack:
+            staged = {}
+            for shard in sorted(shards):
+                db = await stack.enter_async_context(self.sessions[shard]())
+                staged[shard] = (db, await stage(shard, db))
+            for db, _ in staged.values():
+                await db.commit()
+        return {shard: result for shard, (_, result) in staged.items()}
+
+    def _split_ids(self, ids: Optional[List[int]]):
+        # shard -> its ids, or every shard -> None for a filter-only batch.
+        if ids is None:
+            return dict.fromkeys(range(len(self.sessions)))
+        by_shard = defaultdict(list)
+        for restaurant_id in ids:
+            by_shard[restaurant_id % len(self.sessions)].append(restaurant_id)
+        return by_shard
+
+    async def bulk_create_restaurants(self, restaurants):
+        positions = defaultdict(list)
+        for i, restaurant in enumerate(restaurants):
+            positions[self.shard_for_city(restaurant.city)].append(i)
+        count = len(self.sessions)
+        async with self._unique_writes:
+            await self._check_unique([r.name for r in restaurants], [r.phone_number for r in restaurants])
+            staged = await self._stage_on(
+                positions,
+                lambda shard, db: crud.stage_bulk_create(db, [restaurants[i] for i in positions[shard]], (shard, count)),
+            )
+        ids = [None] * len(restaurants)
+        for shard, (rows, changes) in staged.items():
+            crud.publish(changes, rows)
+            for i, row in zip(positions[shard], rows):
+                ids[i] = row.id
+        return ids
+
+    async def batch_update_restaurants(self, ids, filter, changes):
+        by_shard = self._split_ids(ids)
+        if not changes:
+            found = await asyncio.gather(*(
+                self._on(shard, lambda repo, shard_ids=shard_ids: crud.matching_ids(repo.db, shard_ids, filter))
+                for shard, shard_ids in by_shard.items()
+            ))
+            return crud.batch_outcomes(ids, set().union(*found), "unchanged")
+        staged = await self._stage_on(by_shard, lambda shard, db: crud.stage_batch_update(db, by_shard[shard], filter, changes))
+        updated = set()
+        for rows, outbox in staged.values():
+            crud.publish(outbox, rows)
+            updated.update(row.id for row in rows)
+        return crud.batch_outcomes(ids, updated, "updated")
+
+    async def batch_delete_restaurants(self, ids, filter):
+        by_shard = self._split_ids(ids)
+        staged = await self._stage_on(by_shard, lambda shard, db: crud.stage_batch_delete(db, by_shard[shard], filter))
+        deleted = set()
+        for removed, outbox in staged.values():
+            crud.publish(outbox)
+            deleted |= removed
+        return crud.batch_outcomes(ids, deleted, "deleted")
+
+
+def _duplicate(column: str) -> IntegrityError:
+    # Same exception the SQL backend raises, so callers handle both alike.
+    return IntegrityError("restaurants", None, ValueError(f"UNIQUE constraint failed: restaurants.{column}"))
+
+
+class InMemoryRestaurantRepository(RestaurantRepository):
+    # Rows live in a dict in id order, with hash indexes on name and phone
+    # (which also enforce uniqueness), per-cuisine id sets and a sorted list
+    # of active ids for paging. Every method completes without awaiting, so
+    # each call is atomic on the event loop.
+    def __init__(self):
+        self._rows = {}
+        self._by_name = {}
+        self._by_phone = {}
+        self._by_cuisine = defaultdict(set)
+        self._active_ids = []
+        self._next_id = 1
+
+    def _index(self, row):
+        self._by_name[row.name] = row.id
+        self._by_phone[row.phone_number] = row.id
+        self._by_cuisine[row.cuisine_type.lower()].add(row.id)
+        if row.is_active:
+            insort(self._active_ids, row.id)
+
+    def _unindex(self, row):
+        del self._by_name[row.name]
+        del self._by_phone[row.phone_number]
+        ids = self._by_cuisine[row.cuisine_type.lower()]
+        ids.discard(row.id)
+        if not ids:
+            del self._by_cuisine[row.cuisine_type.lower()]
+        if row.is_active:
+            del self._active_ids[bisect_left(self._active_ids, row.id)]
+
+    def _check_unique(self, name, phone_number, restaurant_id=None):
+        if self._by_name.get(name, restaurant_id) != restaurant_id:
+            raise _duplicate("name")
+        if self._by_phone.get(phone_number, restaurant_id) != restaurant_id:
+            raise _duplicate("phone_number")
+
+    def _matching_ids(self, cuisine_type, active_only):
+        if cuisine_type:
+            needle = cuisine_type.lower()
+            ids = set()
+            for cuisine, cuisine_ids in self._by_cuisine.items():
+                if needle in cuisine:
+                    ids |= cuisine_ids
+            if active_only:
+                ids = {i for i in ids if self._rows[i].is_active}
+            return sorted(ids)
+        if active_only:
+            return self._active_ids
+        return list(self._rows)
+
+    def _insert(self, data):
+        row = SimpleNamespace(id=self._next_id, **data, created_at=datetime.now(timezone.utc), updated_at=None)
+        self._next_id += 1
+        self._rows[row.id] = row
+        self._index(row)
+        catalog.put(row)
+        return row
+
+    def rows(self):
+        return list(self._rows.values())
+
+    async def create_restaurant(self, restaurant):
+        data = restaurant.model_dump()
+        self._check_unique(data["name"], data["phone_number"])
+        return self._insert(data)
+
+    async def get_restaurant(self, restaurant_id):
+        return self._rows.get(restaurant_id)
+
+    async def get_restaurant_by_name(self, name):
+        restaurant_id = self._by_name.get(name)
+        return self._rows[restaurant_id] if restaurant_id is not None else None
+
+    async def get_restaurants_by_ids(self, ids, fields=None):
+        return {i: self._rows[i] for i in ids if i in self._rows}
+
+    async def list_restaurants(self, skip=0, limit=100, cuisine_type=None, active_only=False, fields=None):
+        if not cuisine_type and not active_only:
+            # dict order is id order; avoid copying the whole key list.
+            rows = iter(self._rows.values())
+            for _ in range(skip):
+                if next(rows, None) is None:
+                    return []
+            return [row for _, row in zip(range(limit), rows)]
+        ids = self._matching_ids(cuisine_type, active_only)
+        return [self._rows[i] for i in ids[skip:skip + limit]]
+
+    async def count_restaurants(self, cuisine_type=None, active_only=False):
+        if not cuisine_type and not active_only:
+            return len(self._rows)
+        return len(self._matching_ids(cuisine_type, active_only))
+
+    async def update_restaurant(self, restaurant_id, restaurant_update):
+        row = self._rows.get(restaurant_id)
+        if row is None:
+            return None
+        changes = restaurant_update.model_dump(exclude_unset=True)
+        self._check_unique(changes.get("name", row.name), changes.get("phone_number", row.phone_number), restaurant_id)
+        self._unindex(row)
+        for k, v in changes.items():
+            setattr(row, k, v)
+        row.updated_at = datetime.now(timezone.utc)
+        self._index(row)
+        catalog.put(row)
+        return row
+
+    async def delete_restaurant(self, restaurant_id):
+        row = self._rows.pop(restaurant_id, None)
+        if row is None:
+            return False
+        self._unindex(row)
+        catalog.discard(restaurant_id)
+        return True
+
+    async def bulk_create_restaurants(self, restaurants):
+        # Every row is checked, against the others too, before any is added.
+        data = [r.model_dump() for r in restaurants]
+        for d in data:
+            self._check_unique(d["name"], d["phone_number"])
+        if len({d["name"] for d in data}) < len(data):
+            raise _duplicate("name")
+        if len({d["phone_number"] for d in data}) < len(data):
+            raise _duplicate("phone_number")
+        return [self._insert(d).id for d in data]
+
+    def _selected(self, ids, filter):
+        # Same selection as crud's batch conditions: ids and filter both apply.
+        rows = (self._rows[i] for i in dict.fromkeys(ids) if i in self._rows) if ids is not None else self._rows.values()
+        wanted = filter.model_dump(exclude_none=True) if filter is not None else {}
+        return [row for row in rows if all(getattr(row, k) == v for k, v in wanted.items())]
+
+    async def batch_update_restaurants(self, ids, filter, changes):
+        selected = self._selected(ids, filter)
+        if not changes:
+            return crud.batch_outcomes(ids, {row.id for row in selected}, "unchanged")
+        now = datetime.now(timezone.utc)
+        for row in selected:
+            self._unindex(row)
+            for k, v in changes.items():
+                setattr(row, k, v)
+            row.updated_at = now
+            self._index(row)
+            catalog.put(row)
+        return crud.batch_outcomes(ids, {row.id for row in selected}, "updated")
+
+    async def batch_delete_restaurants(self, ids, filter):
+        selected = self._selected(ids, filter)
+        for row in selected:
+            del self._rows[row.id]
+            self._unindex(row)
+            catalog.discard(row.id)
+        return crud.batch_outcomes(ids, {row.id for row in selected}, "deleted")
+
+
+if REPOSITORY_BACKEND == "memory":
+    memory_repository = InMemoryRestaurantRepository()
+    # The catalog warms from these rows instead of the database.
+    catalog.source = memory_repository.rows
+
+    # Writes still hand out the read-your-writes token, so the caller's next
+    # listing skips the response cache.
+    async def get_repository(response: Response) -> RestaurantRepository:
+        mark_wrote(response)
+        return memory_repository
+
+    async def get_read_repository() -> RestaurantRepository:
+        return memory_repository
+
+    @asynccontextmanager
+    async def read_repository(primary: bool = False):
+        yield memory_repository
+
+    @asynccontextmanager
+    async def write_repository():
+        yield memory_repository
+elif REPOSITORY_BACKEND == "sharded":
+    sharded_repository = ShardedRestaurantRepository()
+
+    # One admission slot per request, however many shards it touches.
+    async def get_read_repository() -> RestaurantRepository:
+        async with db_sessions.slot():
+            yield sharded_repository
+
+    async def get_repository(response: Response) -> RestaurantRepository:
+        mark_wrote(response)
+        async with db_sessions.slot():
+            yield sharded_repository
+
+    @asynccontextmanager
+    async def read_repository(primary: bool = False):
+        async with db_sessions.slot():
+            yield sharded_repository
+
+    @asynccontextmanager
+    async def write_repository():
+        yield sharded_repository
+else:
+    async def get_repository(db: AsyncSession = Depends(get_db)) -> RestaurantRepository:
+        return SqlAlchemyRestaurantRepository(db)
+
+    async def get_read_repository(db: AsyncSession = Depends(get_read_db)) -> RestaurantRepository:
+        return SqlAlchemyRestaurantRepository(db)
+
+    # For reads outside a request's dependencies, such as response cache
+    # rebuilds. primary=True skips the replicas, as get_read_db does after
+    # a write.
+    @asynccontextmanager
+    async def read_repository(primary: bool = False):
+        factory = async_session if primary else next_read_session()
+        async with db_sessions.slot(), factory() as db:
+            yield SqlAlchemyRestaurantRepository(db)
+
+    # Writes from background jobs. No admission slot: a job should wait for
+    # the database, not fail because requests are busy.
+    @asynccontextmanager
+    async def write_repository():
+        async with async_session() as db:
+            yield SqlAlchemyRestaurantRepository(db)
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from cache import catalog
+
+# Encoded listing pages, shared by every caller until something writes.
+# Each entry remembers the catalog version it was built at; the version goes
+# up on every change the catalog sees, local or replayed from another
+# worker's outbox. A stale entry younger than RESPONSE_CACHE_MAX_STALE_SECONDS
+# is still served while one background task per key rebuilds it; older ones
+# are rebuilt before answering. Memory is bounded by total body bytes, least
+# recently used first out. RESPONSE_CACHE_BYTES=0 turns the cache off.
+
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", str(32 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_STALE_SECONDS = float(os.getenv("RESPONSE_CACHE_MAX_STALE_SECONDS", "30"))
+
+logger = logging.getLogger("zomato.response_cache")
+
+
+class _Entry:
+    __slots__ = ("version", "built_at", "body")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.body = body
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES, max_stale: float = RESPONSE_CACHE_MAX_STALE_SECONDS):
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self.version = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        # Key -> the one task currently building it.
+        self._pending = {}
+
+    # Catalog listener: any change makes every cached page stale.
+    @staticmethod
+    def build(rows):
+        return None
+
+    def swap(self, built):
+        self.version += 1
+
+    def put(self, row):
+        self.version += 1
+
+    def discard(self, restaurant_id: int):
+        self.version += 1
+
+    async def get(self, key, build) -> bytes:
+        # build() returns the encoded body; key must be hashable.
+        if self.max_bytes <= 0:
+            return await build()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if entry.version == self.version:
+                return entry.body
+            if time.monotonic() - entry.built_at < self.max_stale:
+                self._refresh(key, build)
+                return entry.body
+        # Shielded: a caller going away must not cancel a build others share.
+        return await asyncio.shield(self._refresh(key, build))
+
+    def _refresh(self, key, build) -> asyncio.Task:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._build(key, build))
+            self._pending[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key, task: asyncio.Task):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("rebuilding %r failed: %r", key, task.exception())
+
+    async def _build(self, key, build) -> bytes:
+        # Tagged with the version from before the query, so a write that
+        # lands meanwhile leaves the new entry already stale.
+        version = self.version
+        body = await build()
+        self._store(key, version, body)
+        return body
+
+    def _store(self, key, version: int, body: bytes):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body)
+        if len(body) > self.max_bytes:
+            return
+        self._entries[key] = _Entry(version, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+
+response_cache = ResponseCache()
+catalog.subscribe(response_cache)
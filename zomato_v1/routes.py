@@ -1,54 +1,269 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from database import get_db
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status, Query
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from database import read_sessions_for, shard_sessions, wrote_recently
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-import crud
-from schemas import RestaurantCreate, RestaurantOut, RestaurantUpdate
+from typing import List, Optional
+from admission import admit, client_key, db_sessions
+from cache import catalog
+from changefeed import change_out, list_changes, stream_changes
+from idempotency import idempotency_store
+from repository import RestaurantRepository, get_read_repository, get_repository, read_repository
+from response_cache import response_cache
+from similar import MAX_SIMILAR, similar_restaurants
+from suggest import MAX_SUGGESTIONS, suggestions
+from schemas import (
+    RESTAURANT_FIELDS,
+    BatchResult,
+    RestaurantBatchGet,
+    RestaurantBatchSelect,
+    RestaurantBatchUpdate,
+    RestaurantCreate,
+    RestaurantCreateList,
+    RestaurantIds,
+    RestaurantOut,
+    RestaurantOutList,
+    RestaurantSimilar,
+    RestaurantSuggestion,
+    RestaurantUpdate,
+    restaurant_batch_adapter,
+    restaurant_list_adapter,
+)
 
 from sqlalchemy.exc import IntegrityError
 
-router = APIRouter(prefix="/restaurants", tags=["restaurants"])
+router = APIRouter(prefix="/restaurants", tags=["restaurants"], dependencies=[Depends(admit)])
+# The change feed reads the SQL outbox, so the in-memory backend has none.
+changes_router = APIRouter(prefix="/restaurants", tags=["restaurants"], dependencies=[Depends(admit)])
+
+MAX_PAGE_SIZE = 100
+
+
+def catalog_loaded():
+    # Cuisines, suggestions and similar restaurants are served from the
+    # in-memory catalog, which loads after the worker starts accepting
+    # connections. Until then answer 503 rather than an empty result.
+    if not catalog.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Catalog is still loading", headers={"Retry-After": "1"})
+
+
+def field_set(fields: Optional[str] = Query(None, description=f"Comma separated subset of: {', '.join(RESTAURANT_FIELDS)}. id is always included.")):
+    if fields is None:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted.difference(RESTAURANT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    wanted.add("id")
+    return tuple(f for f in RESTAURANT_FIELDS if f in wanted)
+
+
+def _encode_listing(rows, fields) -> bytes:
+    adapter = RestaurantOutList if fields is None else restaurant_list_adapter(fields)
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+async def _listing(request: Request, fields, **query):
+    # Listing pages come out of response_cache as encoded bytes. query is
+    # the validated list_restaurants arguments, so it doubles as the key:
+    # the same page asked for with different spelling is one entry.
+    async def build(primary: bool = False):
+        async with read_repository(primary) as repo:
+            rows = await repo.list_restaurants(fields=fields, **query)
+        return _encode_listing(rows, fields)
+
+    if wrote_recently(request):
+        # Stale pages could hide the caller's own write.
+        body = await build(primary=True)
+    else:
+        body = await response_cache.get((fields, *sorted(query.items())), build)
+    return Response(body, media_type="application/json")
+
+
+def _fold_cuisine(cuisine: str) -> str:
+    # Search is ILIKE, which only folds ASCII case in SQLite.
+    return cuisine.lower() if cuisine.isascii() else cuisine
 
 
 @router.post("/", response_model=RestaurantOut, status_code=status.HTTP_201_CREATED)
-async def create_restaurant_endpoint(restaurant_in: RestaurantCreate, db: AsyncSession = Depends(get_db)):
+async def create_restaurant_endpoint(restaurant_in: RestaurantCreate, repo: RestaurantRepository = Depends(get_repository)):
     try:
-        new = await crud.create_restaurant(db, restaurant_in)
+        new = await repo.create_restaurant(restaurant_in)
         return new
     except IntegrityError as e:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Restaurant with same name or phone already exists.")
 
 
+_BULK_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/RestaurantCreate"}}}},
+    }
+}
+
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED, openapi_extra=_BULK_BODY)
+async def bulk_create_endpoint(request: Request, repo: RestaurantRepository = Depends(get_repository)):
+    # Validated from the raw bytes in one call instead of per object.
+    try:
+        restaurants_in = RestaurantCreateList.validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors(include_url=False))
+    if not restaurants_in:
+        return {"ids": []}
+    try:
+        ids = await repo.bulk_create_restaurants(restaurants_in)
+    except IntegrityError:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Restaurant with same name or phone already exists.")
+    return {"ids": ids}
+
+
 @router.get("/", response_model=List[RestaurantOut])
-async def list_restaurants_endpoint(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1), db: AsyncSession = Depends(get_db)):
-    rows = await crud.list_restaurants(db, skip=skip, limit=limit)
-    return rows
+async def list_restaurants_endpoint(request: Request, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), fields=Depends(field_set)):
+    return await _listing(request, fields, skip=skip, limit=limit)
 
 
 @router.get("/active", response_model=List[RestaurantOut])
-async def list_active_endpoint(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1), db: AsyncSession = Depends(get_db)):
-    rows = await crud.list_active_restaurants(db, skip=skip, limit=limit)
-    return rows
+async def list_active_endpoint(request: Request, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), fields=Depends(field_set)):
+    return await _listing(request, fields, skip=skip, limit=limit, active_only=True)
 
 
 @router.get("/search", response_model=List[RestaurantOut])
-async def search_cuisine_endpoint(cuisine: str = Query(..., min_length=1), skip: int = Query(0, ge=0), limit: int = Query(10, ge=1), db: AsyncSession = Depends(get_db)):
-    rows = await crud.search_by_cuisine(db, cuisine=cuisine, skip=skip, limit=limit)
-    return rows
+async def search_cuisine_endpoint(request: Request, cuisine: str = Query(..., min_length=1), skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE), fields=Depends(field_set)):
+    return await _listing(request, fields, skip=skip, limit=limit, cuisine_type=_fold_cuisine(cuisine))
+
+
+@router.get("/suggest", response_model=List[RestaurantSuggestion], dependencies=[Depends(catalog_loaded)])
+async def suggest_endpoint(q: str = Query(..., min_length=1, max_length=100), limit: int = Query(8, ge=1, le=MAX_SUGGESTIONS)):
+    # Served from memory; never touches the database.
+    return suggestions.suggest(q, limit)
+
+
+def change_shard(shard: int = Query(0, ge=0, description="Shard whose outbox to read; each shard numbers its changes on its own.")) -> int:
+    if shard >= len(shard_sessions):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Shard not found")
+    return shard
+
+
+async def get_changes_db(request: Request, shard: int = Depends(change_shard)):
+    async with db_sessions.slot(), read_sessions_for(request, shard)() as session:
+        yield session
+
+
+@changes_router.get("/changes")
+async def list_changes_endpoint(since: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), db: AsyncSession = Depends(get_changes_db)):
+    changes = await list_changes(db, since=since, limit=limit)
+    return {
+        "changes": [change_out(c) for c in changes],
+        "next_since": changes[-1].seq if changes else since,
+    }
+
+
+@changes_router.get("/changes/stream")
+async def stream_changes_endpoint(since: Optional[int] = Query(None, ge=0), last_event_id: Optional[int] = Header(None), shard: int = Depends(change_shard)):
+    start = since if since is not None else (last_event_id or 0)
+    return StreamingResponse(stream_changes(start, shard), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/cuisines", dependencies=[Depends(catalog_loaded)])
+async def list_cuisines_endpoint():
+    return [{"cuisine_type": c, "count": n} for c, n in catalog.cuisines()]
+
+
+def _fingerprint(batch) -> bytes:
+    # The request as validated, so spelling and key order don't matter but
+    # an explicitly sent field does.
+    return batch.model_dump_json(exclude_unset=True).encode()
+
+
+def _batch_result(outcomes) -> BatchResult:
+    return BatchResult(
+        affected=sum(1 for s in outcomes.values() if s != "not_found"),
+        results=[{"id": i, "status": s} for i, s in outcomes.items()],
+    )
+
+
+async def _get_many(ids: List[int], request: Request, repo: RestaurantRepository, fields):
+    # Snapshot hits first; every miss is fetched in one IN (...) query.
+    ids = list(dict.fromkeys(ids))
+    found = {}
+    if not wrote_recently(request):
+        for restaurant_id in ids:
+            row = catalog.snapshot_row(restaurant_id)
+            if row is not None:
+                found[restaurant_id] = row
+    misses = [i for i in ids if i not in found]
+    if misses:
+        found.update(await repo.get_restaurants_by_ids(misses, fields))
+    body = {"results": [found[i] for i in ids if i in found], "missing": [i for i in ids if i not in found]}
+    if fields is None:
+        return body
+    adapter = restaurant_batch_adapter(fields)
+    return Response(adapter.dump_json(adapter.validate_python(body)), media_type="application/json")
+
+
+@router.get("/batch", response_model=RestaurantBatchGet)
+async def batch_get_endpoint(request: Request, ids: List[int] = Query(..., min_length=1, max_length=500), fields=Depends(field_set), repo: RestaurantRepository = Depends(get_read_repository)):
+    return await _get_many(ids, request, repo, fields)
+
+
+@router.post("/batch-get", response_model=RestaurantBatchGet)
+async def batch_get_post_endpoint(body: RestaurantIds, request: Request, fields=Depends(field_set), repo: RestaurantRepository = Depends(get_read_repository)):
+    return await _get_many(body.ids, request, repo, fields)
+
+
+def _idempotency_key(request: Request, method: str, key: Optional[str]):
+    # A blank header means no key. Keys are scoped to the client, so two
+    # clients picking the same key never share a result.
+    key = (key or "").strip()
+    return f"{client_key(request)} {method} {key}" if key else None
+
+
+@router.patch("/batch", response_model=BatchResult)
+async def batch_update_endpoint(batch: RestaurantBatchUpdate, request: Request, idempotency_key: Optional[str] = Header(None), repo: RestaurantRepository = Depends(get_repository)):
+    async def run():
+        changes = batch.updates.model_dump(exclude_unset=True)
+        try:
+            return _batch_result(await repo.batch_update_restaurants(batch.ids, batch.filter, changes))
+        except IntegrityError:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Update would violate a constraint.")
+
+    return await idempotency_store.run(_idempotency_key(request, "PATCH", idempotency_key), run, _fingerprint(batch))
+
+
+@router.delete("/batch", response_model=BatchResult)
+async def batch_delete_endpoint(batch: RestaurantBatchSelect, request: Request, idempotency_key: Optional[str] = Header(None), repo: RestaurantRepository = Depends(get_repository)):
+    async def run():
+        return _batch_result(await repo.batch_delete_restaurants(batch.ids, batch.filter))
+
+    return await idempotency_store.run(_idempotency_key(request, "DELETE", idempotency_key), run, _fingerprint(batch))
 
 
 @router.get("/{restaurant_id}", response_model=RestaurantOut)
-async def get_restaurant_endpoint(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    r = await crud.get_restaurant(db, restaurant_id)
+async def get_restaurant_endpoint(restaurant_id: int, request: Request, repo: RestaurantRepository = Depends(get_read_repository)):
+    if not wrote_recently(request):
+        r = catalog.snapshot_row(restaurant_id)
+        if r is not None:
+            return r
+    r = await repo.get_restaurant(restaurant_id)
     if not r:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
     return r
 
 
+@router.get("/{restaurant_id}/similar", response_model=List[RestaurantSimilar], dependencies=[Depends(catalog_loaded)])
+async def similar_restaurants_endpoint(restaurant_id: int, limit: int = Query(10, ge=1, le=MAX_SIMILAR)):
+    # Served from memory; active restaurants only, best match first.
+    similar = similar_restaurants.similar(restaurant_id, limit)
+    if similar is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
+    return similar
+
+
 @router.put("/{restaurant_id}", response_model=RestaurantOut)
-async def update_restaurant_endpoint(restaurant_id: int, updates: RestaurantUpdate, db: AsyncSession = Depends(get_db)):
+async def update_restaurant_endpoint(restaurant_id: int, updates: RestaurantUpdate, repo: RestaurantRepository = Depends(get_repository)):
     try:
-        r = await crud.update_restaurant(db, restaurant_id, updates)
+        r = await repo.update_restaurant(restaurant_id, updates)
     except IntegrityError:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Update would violate unique constraint (name/phone).")
     if not r:
@@ -57,8 +272,8 @@ async def update_restaurant_endpoint(restaurant_id: int, updates: RestaurantUpda
 
 
 @router.delete("/{restaurant_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_restaurant_endpoint(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    ok = await crud.delete_restaurant(db, restaurant_id)
+async def delete_restaurant_endpoint(restaurant_id: int, repo: RestaurantRepository = Depends(get_repository)):
+    ok = await repo.delete_restaurant(restaurant_id)
     if not ok:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Restaurant not found")
     return None
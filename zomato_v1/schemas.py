@@ -1,51 +1,67 @@
-from pydantic import BaseModel, Field, constr, field_validator
-from typing import Optional
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, constr, create_model, field_validator, model_validator
+from typing import List, Literal, Optional, Tuple
 from datetime import time, datetime
 
 PHONE_REGEX = r"^\+?\d{7,15}$"
 
+# Shared constrained types, built once and reused by every model below.
+Name = constr(min_length=3, max_length=100)
+CuisineType = constr(min_length=2, max_length=50)
+Address = constr(min_length=3)
+PhoneNumber = constr(pattern=PHONE_REGEX)
+City = constr(min_length=2, max_length=50)
+
+
+def _check_times(v, info):
+    ot = info.data.get("opening_time")
+    if ot and v and v == ot:
+        raise ValueError("closing_time must be different from opening_time")
+    return v
+
+
+def _not_null(v):
+    if v is None:
+        raise ValueError("may be omitted but not null")
+    return v
+
+
 class RestaurantBase(BaseModel):
-    name: constr(min_length=3, max_length=100)
+    name: Name
     description: Optional[str] = None
-    cuisine_type: constr(min_length=2, max_length=50)
-    address: constr(min_length=3)
-    phone_number: constr(pattern=PHONE_REGEX)
+    cuisine_type: CuisineType
+    address: Address
+    phone_number: PhoneNumber
+    city: Optional[City] = None
     rating: Optional[float] = Field(default=0.0, ge=0.0, le=5.0)
     is_active: Optional[bool] = True
     opening_time: Optional[time] = None
     closing_time: Optional[time] = None
 
-    @field_validator("closing_time")
-    def validate_times(cls, v, info):
-        ot = info.data.get("opening_time")
-        if ot and v:
-            if v == ot:
-                raise ValueError("closing_time must be different from opening_time")
-        return v
+    validate_times = field_validator("closing_time")(_check_times)
 
 
 class RestaurantCreate(RestaurantBase):
     pass
 
 
+# Validates a whole JSON array in one call, straight from the request bytes.
+RestaurantCreateList = TypeAdapter(List[RestaurantCreate])
+
+
 class RestaurantUpdate(BaseModel):
-    name: Optional[constr(min_length=3, max_length=100)] = None
+    name: Optional[Name] = None
     description: Optional[str] = None
-    cuisine_type: Optional[constr(min_length=2, max_length=50)] = None
-    address: Optional[constr(min_length=3)] = None
-    phone_number: Optional[constr(pattern=PHONE_REGEX)] = None
+    cuisine_type: Optional[CuisineType] = None
+    address: Optional[Address] = None
+    phone_number: Optional[PhoneNumber] = None
+    city: Optional[City] = None
     rating: Optional[float] = Field(None, ge=0.0, le=5.0)
     is_active: Optional[bool] = None
     opening_time: Optional[time] = None
     closing_time: Optional[time] = None
 
-    @field_validator("closing_time")
-    def validate_times(cls, v, info):
-        ot = info.data.get("opening_time")
-        if ot and v:
-            if v == ot:
-                raise ValueError("closing_time must be different from opening_time")
-        return v
+    validate_times = field_validator("closing_time")(_check_times)
 
 
 class RestaurantOut(RestaurantBase):
@@ -53,6 +69,102 @@ class RestaurantOut(RestaurantBase):
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+RestaurantOutList = TypeAdapter(List[RestaurantOut])
+
+
+class RestaurantFilter(BaseModel):
+    cuisine_type: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
+class RestaurantBatchChanges(BaseModel):
+    # name and phone_number are unique, so they can't be set on many rows at once.
+    description: Optional[str] = None
+    cuisine_type: Optional[CuisineType] = None
+    address: Optional[Address] = None
+    rating: Optional[float] = Field(None, ge=0.0, le=5.0)
+    is_active: Optional[bool] = None
+    opening_time: Optional[time] = None
+    closing_time: Optional[time] = None
+
+    # Omitted is fine; null would break the column's NOT NULL.
+    reject_nulls = field_validator("cuisine_type", "address", "rating", "is_active")(_not_null)
+    validate_times = field_validator("closing_time")(_check_times)
+
+
+class RestaurantBatchSelect(BaseModel):
+    ids: Optional[List[int]] = Field(default=None, max_length=10000)
+    filter: Optional[RestaurantFilter] = None
+
+    @model_validator(mode="after")
+    def require_selection(self):
+        if self.ids is None and (self.filter is None or not self.filter.model_dump(exclude_none=True)):
+            raise ValueError("either ids or a non-empty filter is required")
+        return self
+
+
+class RestaurantBatchUpdate(RestaurantBatchSelect):
+    updates: RestaurantBatchChanges
+
+
+class RestaurantSuggestion(BaseModel):
+    id: int
+    name: str
+    cuisine_type: str
+    rating: float
+
+
+class RestaurantSimilar(RestaurantSuggestion):
+    score: float
+
+
+class RestaurantIds(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=500)
+
+
+class RestaurantBatchGet(BaseModel):
+    results: List[RestaurantOut]
+    missing: List[int]
+
+
+RESTAURANT_FIELDS = tuple(RestaurantOut.model_fields)
+
+
+# Slim response models for ?fields=, built once per field set. fields is a
+# tuple in RESTAURANT_FIELDS order, so equal sets share one entry.
+@lru_cache(maxsize=256)
+def restaurant_projection(fields: Tuple[str, ...]):
+    return create_model(
+        f"RestaurantOut_{'_'.join(fields)}",
+        __config__=ConfigDict(from_attributes=True),
+        **{f: (RestaurantOut.model_fields[f].annotation, RestaurantOut.model_fields[f]) for f in fields},
+    )
+
+
+@lru_cache(maxsize=256)
+def restaurant_list_adapter(fields: Tuple[str, ...]) -> TypeAdapter:
+    return TypeAdapter(List[restaurant_projection(fields)])
+
+
+@lru_cache(maxsize=256)
+def restaurant_batch_adapter(fields: Tuple[str, ...]) -> TypeAdapter:
+    item = restaurant_projection(fields)
+    return TypeAdapter(create_model(f"RestaurantBatchGet_{'_'.join(fields)}", results=(List[item], ...), missing=(List[int], ...)))
+
+
+class BatchOutcome(BaseModel):
+    id: int
+    status: str
+
+
+class BatchResult(BaseModel):
+    affected: int
+    results: List[BatchOutcome]
+
 
+class JobCreate(BaseModel):
+    # Imports have their own endpoint, POST /jobs/import.
+    kind: Literal["export", "aggregates", "reindex"]
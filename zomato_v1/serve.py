@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+import uvicorn
+import migrations
+
+# Production launcher: `python serve.py`. Migrations run once here in the
+# parent, then N workers are started with uvloop/httptools when installed.
+# On SIGTERM uvicorn stops accepting connections and drains in-flight
+# requests for up to GRACEFUL_TIMEOUT seconds.
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WORKERS = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+
+def main():
+    code = asyncio.run(migrations.main(["migrations.py", "upgrade"]))
+    if code:
+        return code
+    os.environ["AUTO_MIGRATE"] = "0"
+    uvicorn.run(
+        "main:app",
+        host=HOST,
+        port=PORT,
+        workers=WORKERS,
+        loop="auto",
+        http="auto",
+        proxy_headers=True,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
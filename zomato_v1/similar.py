@@ -0,0 +1,260 @@
+import zlib
+from collections import Counter, OrderedDict
+from datetime import time
+from functools import lru_cache
+
+import numpy as np
+
+from cache import catalog
+from suggest import normalize
+
+# "Similar restaurants" by a blend of three scores, each computed for every
+# restaurant at once with NumPy:
+#
+#   text    cosine of TF-IDF vectors over description words and the cuisine,
+#           hashed into HASH_BUCKETS. Kept as an inverted index: per bucket,
+#           the slots of the rows holding it and their normalised weights,
+#           so a query only touches the postings of its own terms.
+#   rating  1 - |difference| / 5.
+#   hours   overlap of the opening hours, as half-hour slots in a bitmask.
+#
+# The top k come from argpartition. IDF is taken from the whole catalog on
+# load (startup, or the reindex job); rows written afterwards are weighted
+# with the document frequencies of the moment. Kept in step with writes
+# through catalog.subscribe.
+
+MAX_SIMILAR = 50
+HASH_BUCKETS = 1 << 18
+TEXT_WEIGHT = 0.7
+RATING_WEIGHT = 0.15
+HOURS_WEIGHT = 0.15
+# The cuisine counts as this many occurrences of its term.
+CUISINE_TF = 2
+MEMO_SIZE = 4096
+SLOTS_PER_DAY = 48
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+_NO_SLOTS = np.zeros(0, dtype=np.int32)
+_NO_WEIGHTS = np.zeros(0, dtype=np.float32)
+
+
+def _popcount_bytes(values):
+    # Set bits of every uint64, counted byte by byte.
+    return np.unpackbits(np.ascontiguousarray(values).view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+# np.bitwise_count needs NumPy 2.0.
+_popcount = getattr(np, "bitwise_count", _popcount_bytes)
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(term: str) -> int:
+    return zlib.crc32(term.encode()) % HASH_BUCKETS
+
+
+def _term_counts(row) -> Counter:
+    counts = Counter(_bucket(word) for word in normalize(row["description"]).split())
+    cuisine = normalize(row["cuisine_type"])
+    if cuisine:
+        counts[_bucket("cuisine:" + cuisine)] += CUISINE_TF
+    return counts
+
+
+def _terms(row):
+    # Distinct buckets of the row and how often each occurs.
+    counts = _term_counts(row)
+    return (
+        np.fromiter(counts.keys(), dtype=np.intp, count=len(counts)),
+        np.fromiter(counts.values(), dtype=np.float32, count=len(counts)),
+    )
+
+
+def _minutes(value):
+    # Outbox rows carry times as ISO strings.
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def _hours(row) -> int:
+    opens, closes = _minutes(row["opening_time"]), _minutes(row["closing_time"])
+    if opens is None or closes is None:
+        return 0
+    first, last = opens // 30, -(-closes // 30)
+    if closes > opens:
+        return ((1 << last) - 1) & ~((1 << first) - 1)
+    # Closes after midnight (or never).
+    return (FULL_DAY & ~((1 << first) - 1)) | ((1 << last) - 1)
+
+
+class SimilarIndex:
+    def __init__(self):
+        self.rows = {}
+        self.slot_of = {}
+        self.size = 0
+        self.free = []
+        self._allocate(0)
+        # Document frequency per bucket; each row's (buckets, weights).
+        self.df = np.zeros(HASH_BUCKETS, dtype=np.float32)
+        self.docs = 0
+        self.terms = {}
+        # Bucket -> (slots, weights) of the rows holding it.
+        self.postings = {}
+        self._memo = OrderedDict()
+
+    def _allocate(self, capacity: int):
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.ratings = np.zeros(capacity, dtype=np.float32)
+        self.hours = np.zeros(capacity, dtype=np.uint64)
+        # Active rows, the only ones recommended.
+        self.live = np.zeros(capacity, dtype=bool)
+
+    def _grow(self):
+        old = (self.ids, self.ratings, self.hours, self.live)
+        self._allocate(max(16, 2 * len(self.ids)))
+        for new, values in zip((self.ids, self.ratings, self.hours, self.live), old):
+            new[:len(values)] = values
+
+    def _weights(self, buckets, counts):
+        weights = (1 + np.log(counts)) * (np.log((1 + self.docs) / (1 + self.df[buckets])) + 1)
+        norm = np.linalg.norm(weights)
+        return weights / norm if norm else weights
+
+    @staticmethod
+    def build(rows):
+        # A fresh index, filled off the event loop; swap() adopts it whole.
+        index = SimilarIndex()
+        index._fill(rows)
+        return index
+
+    def swap(self, built):
+        self.__dict__.update(vars(built))
+
+    def _fill(self, rows):
+        counts = [_term_counts(r) for r in rows]
+        n = len(rows)
+        self.rows = {r["id"]: r for r in rows}
+        self.slot_of = {r["id"]: i for i, r in enumerate(rows)}
+        self.size = n
+        self.free = []
+        self._allocate(max(16, n))
+        self.ids[:n] = [r["id"] for r in rows]
+        self.ratings[:n] = [r["rating"] for r in rows]
+        self.hours[:n] = [_hours(r) for r in rows]
+        self.live[:n] = [bool(r["is_active"]) for r in rows]
+        # Every (row, bucket, count) flat, so weights and norms come out of a
+        # few whole-array operations.
+        lengths = np.fromiter((len(c) for c in counts), dtype=np.intp, count=n)
+        slots = np.repeat(np.arange(n, dtype=np.int32), lengths)
+        buckets = np.fromiter((b for c in counts for b in c), dtype=np.intp, count=len(slots))
+        tf = np.fromiter((v for c in counts for v in c.values()), dtype=np.float32, count=len(slots))
+        self.df = np.bincount(buckets, minlength=HASH_BUCKETS).astype(np.float32)
+        self.docs = n
+        weights = (1 + np.log(tf)) * (np.log((1 + n) / (1 + self.df[buckets])) + 1)
+        norms = np.sqrt(np.bincount(slots, weights=weights * weights, minlength=n))
+        weights = (weights / np.where(norms > 0, norms, 1)[slots]).astype(np.float32)
+        bounds = np.cumsum(lengths)[:-1]
+        self.terms = dict(zip(self.ids[:n].tolist(), zip(np.split(buckets, bounds), np.split(weights, bounds))))
+        order = np.argsort(buckets, kind="stable")
+        buckets, slots, weights = buckets[order], slots[order], weights[order]
+        starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        self.postings = dict(zip(buckets[starts].tolist(), zip(np.split(slots, starts[1:]), np.split(weights, starts[1:]))))
+
+    def put(self, row):
+        restaurant_id = row["id"]
+        slot = self.slot_of.get(restaurant_id)
+        if slot is None:
+            slot = self._new_slot()
+            self.slot_of[restaurant_id] = slot
+        else:
+            self._forget_terms(restaurant_id, slot)
+        buckets, counts = _terms(row)
+        self.df[buckets] += 1
+        self.docs += 1
+        weights = self._weights(buckets, counts)
+        self.terms[restaurant_id] = (buckets, weights)
+        for bucket, weight in zip(buckets.tolist(), weights.tolist()):
+            s, w = self.postings.get(bucket, (_NO_SLOTS, _NO_WEIGHTS))
+            self.postings[bucket] = (np.append(s, np.int32(slot)), np.append(w, np.float32(weight)))
+        self.ids[slot] = restaurant_id
+        self.ratings[slot] = row["rating"]
+        self.hours[slot] = _hours(row)
+        self.live[slot] = bool(row["is_active"])
+        self.rows[restaurant_id] = row
+        self._memo.clear()
+
+    def discard(self, restaurant_id: int):
+        slot = self.slot_of.pop(restaurant_id, None)
+        if slot is None:
+            return
+        self._forget_terms(restaurant_id, slot)
+        del self.rows[restaurant_id]
+        self.ids[slot] = -1
+        self.live[slot] = False
+        self.free.append(slot)
+        self._memo.clear()
+
+    def _forget_terms(self, restaurant_id: int, slot: int):
+        buckets, _ = self.terms.pop(restaurant_id)
+        self.df[buckets] -= 1
+        self.docs -= 1
+        for bucket in buckets.tolist():
+            s, w = self.postings[bucket]
+            keep = s != slot
+            if keep.any():
+                self.postings[bucket] = (s[keep], w[keep])
+            else:
+                del self.postings[bucket]
+
+    def _new_slot(self) -> int:
+        if self.free:
+            return self.free.pop()
+        if self.size == len(self.ids):
+            self._grow()
+        self.size += 1
+        return self.size - 1
+
+    def similar(self, restaurant_id: int, limit: int = 10):
+        # None when the restaurant is unknown.
+        slot = self.slot_of.get(restaurant_id)
+        if slot is None:
+            return None
+        memo_key = (restaurant_id, limit)
+        if memo_key in self._memo:
+            self._memo.move_to_end(memo_key)
+            return self._memo[memo_key]
+        n = self.size
+        buckets, weights = self.terms[restaurant_id]
+        postings = [self.postings[b] for b in buckets.tolist()]
+        score = RATING_WEIGHT * (1 - np.abs(self.ratings[:n] - self.ratings[slot]) / 5)
+        if postings:
+            score += np.bincount(
+                np.concatenate([s for s, _ in postings]),
+                weights=np.concatenate([w * (TEXT_WEIGHT * q) for (_, w), q in zip(postings, weights.tolist())]),
+                minlength=n,
+            )
+        hours = self.hours[slot]
+        if hours:
+            both = _popcount(self.hours[:n] & hours)
+            either = _popcount(self.hours[:n] | hours)
+            score += HOURS_WEIGHT * (both / either)
+        score = np.where(self.live[:n], score, -np.inf)
+        score[slot] = -np.inf
+        k = min(limit, n)
+        top = np.argpartition(-score, k - 1)[:k] if k else np.zeros(0, dtype=np.intp)
+        top = top[np.argsort(-score[top], kind="stable")]
+        result = [
+            {**self.rows[int(self.ids[i])], "score": round(float(score[i]), 4)}
+            for i in top
+            if score[i] > -np.inf
+        ]
+        self._memo[memo_key] = result
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return result
+
+
+similar_restaurants = SimilarIndex()
+catalog.subscribe(similar_restaurants)
@@ -0,0 +1,176 @@
+import asyncio
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+from datetime import datetime, time, timedelta, timezone
+
+from sqlalchemy import func, select
+from models import Restaurant, RestaurantChange
+
+# Compact, memory-mappable catalog snapshot. Layout (little endian):
+#
+#   header   magic, outbox seq, row count n, string count m
+#   columns  n values each, in COLUMNS order, every block padded to 8 bytes
+#   offsets  m + 1 uint64 offsets into the string blob
+#   blob     UTF-8 bytes of every distinct string
+#
+# String columns hold indexes into the interned string table, so a cuisine
+# or address shared by many rows is stored once. Rows are sorted by id.
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "./catalog.snapshot")
+MAGIC = b"ZCATSNP2"
+HEADER = struct.Struct("<8sQQQ")
+NULL_INT = -(2 ** 63)
+NULL_REF = 2 ** 32 - 1
+STRING_COLUMNS = ("name", "description", "cuisine_type", "address", "phone_number", "city")
+COLUMNS = (
+    ("id", "q"),
+    ("rating", "d"),
+    ("is_active", "B"),
+    ("opening_time", "q"),
+    ("closing_time", "q"),
+    ("created_at", "q"),
+    ("updated_at", "q"),
+) + tuple((name, "I") for name in STRING_COLUMNS)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def _time_to_int(t):
+    if t is None:
+        return NULL_INT
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def _int_to_time(v):
+    if v == NULL_INT:
+        return None
+    seconds, micro = divmod(v, 1_000_000)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60, micro)
+
+
+def _datetime_to_int(dt):
+    if dt is None:
+        return NULL_INT
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _int_to_datetime(v):
+    if v == NULL_INT:
+        return None
+    return _EPOCH + timedelta(microseconds=v)
+
+
+def write_snapshot(path: str, rows, seq: int):
+    rows = sorted(rows, key=lambda r: r.id)
+    strings = {}
+    columns = {name: array(code) for name, code in COLUMNS}
+    for r in rows:
+        columns["id"].append(r.id)
+        columns["rating"].append(r.rating)
+        columns["is_active"].append(1 if r.is_active else 0)
+        columns["opening_time"].append(_time_to_int(r.opening_time))
+        columns["closing_time"].append(_time_to_int(r.closing_time))
+        columns["created_at"].append(_datetime_to_int(r.created_at))
+        columns["updated_at"].append(_datetime_to_int(r.updated_at))
+        for name in STRING_COLUMNS:
+            value = getattr(r, name)
+            columns[name].append(NULL_REF if value is None else strings.setdefault(value, len(strings)))
+
+    encoded = [s.encode() for s in strings]
+    offsets = array("Q", [0])
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, seq, len(rows), len(encoded)))
+        for name, _ in COLUMNS:
+            data = columns[name].tobytes()
+            f.write(data + b"\0" * _pad(len(data)))
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+async def dump_catalog(db, path: str = SNAPSHOT_PATH) -> int:
+    # Outbox position first: rows read afterwards can only be newer.
+    seq = (await db.execute(select(func.max(RestaurantChange.seq)))).scalar() or 0
+    result = await db.execute(select(*Restaurant.__table__.columns))
+    # Converting, sorting and writing every row takes a while; keep it off
+    # the event loop.
+    await asyncio.to_thread(lambda: write_snapshot(path, result.all(), seq))
+    return seq
+
+
+class CatalogSnapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        magic, self.seq, n, m = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self.columns = {}
+        offset = HEADER.size
+        for name, code in COLUMNS:
+            size = n * array(code).itemsize
+            self.columns[name] = view[offset:offset + size].cast(code)
+            offset += size + _pad(size)
+        self._offsets = view[offset:offset + (m + 1) * 8].cast("Q")
+        self._blob = view[offset + (m + 1) * 8:]
+        self._strings = [None] * m
+        self.ids = self.columns["id"]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def string(self, ref: int):
+        if ref == NULL_REF:
+            return None
+        s = self._strings[ref]
+        if s is None:
+            s = self._strings[ref] = str(self._blob[self._offsets[ref]:self._offsets[ref + 1]], "utf-8")
+        return s
+
+    def index_of(self, restaurant_id: int):
+        i = bisect_left(self.ids, restaurant_id)
+        if i < len(self.ids) and self.ids[i] == restaurant_id:
+            return i
+        return None
+
+    def row(self, i: int) -> dict:
+        c = self.columns
+        out = {name: self.string(c[name][i]) for name in STRING_COLUMNS}
+        out.update(
+            id=c["id"][i],
+            rating=c["rating"][i],
+            is_active=bool(c["is_active"][i]),
+            opening_time=_int_to_time(c["opening_time"][i]),
+            closing_time=_int_to_time(c["closing_time"][i]),
+            created_at=_int_to_datetime(c["created_at"][i]),
+            updated_at=_int_to_datetime(c["updated_at"][i]),
+        )
+        return out
+
+    def get(self, restaurant_id: int):
+        i = self.index_of(restaurant_id)
+        return None if i is None else self.row(i)
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH):
+    try:
+        return CatalogSnapshot(path)
+    except (FileNotFoundError, ValueError, struct.error):
+        return None
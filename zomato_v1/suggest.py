@@ -0,0 +1,146 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from cache import catalog
+
+# Type-ahead over restaurant names and cuisines. Every word suffix of the
+# normalised name ("royal spice garden", "spice garden", "garden") and the
+# normalised cuisine go into one sorted list of (key, id), so the keys for a
+# prefix are one contiguous slice found by bisect. Narrow prefixes rank that
+# slice by rating; a wide one ("s") instead walks active restaurants best
+# first and stops at limit, which is quick precisely because so many match.
+# Kept in step with writes through catalog.subscribe.
+
+MAX_SUGGESTIONS = 20
+# Largest slice of keys ranked directly; wider prefixes walk by rating.
+SCAN_KEYS = 500
+MEMO_SIZE = 1024
+
+_non_word = re.compile(r"[^0-9a-z]+")
+# Sorts after every character a normalised key can contain.
+_KEY_END = "\x7f"
+
+
+def normalize(text: str) -> str:
+    text = text or ""
+    if not text.isascii():
+        # Strip accents; ASCII text has none to strip.
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _non_word.sub(" ", text.casefold()).strip()
+
+
+def _keys(row) -> tuple:
+    words = normalize(row["name"]).split()
+    keys = {" ".join(words[i:]) for i in range(len(words))}
+    cuisine = normalize(row["cuisine_type"])
+    if cuisine:
+        keys.add(cuisine)
+    return tuple(keys)
+
+
+def _joined(keys) -> str:
+    # "\nk1\nk2": a prefix test over all of a row's keys is one substring search.
+    return "".join("\n" + key for key in keys)
+
+
+def _rank(row) -> tuple:
+    return (-row["rating"], row["name"], row["id"])
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.keys = []
+        self.rows = {}
+        self.row_keys = {}
+        # Active restaurants: rank by id, and ranks best rated first.
+        self.rank_of = {}
+        self.ranked = []
+        # Recent answers; the same prefixes repeat across keystrokes and users.
+        self._memo = OrderedDict()
+
+    @staticmethod
+    def build(rows):
+        # Touches nothing shared, so it can run off the event loop.
+        keys = {r["id"]: _keys(r) for r in rows}
+        rank_of = {r["id"]: _rank(r) for r in rows if r["is_active"]}
+        return (
+            {r["id"]: r for r in rows},
+            {i: _joined(k) for i, k in keys.items()},
+            sorted((key, i) for i, row_keys in keys.items() for key in row_keys),
+            rank_of,
+            sorted(rank_of.values()),
+        )
+
+    def swap(self, built):
+        self.rows, self.row_keys, self.keys, self.rank_of, self.ranked = built
+        self._memo.clear()
+
+    def put(self, row):
+        self._remove(row["id"])
+        keys = _keys(row)
+        self.rows[row["id"]] = row
+        self.row_keys[row["id"]] = _joined(keys)
+        for key in keys:
+            insort(self.keys, (key, row["id"]))
+        if row["is_active"]:
+            self.rank_of[row["id"]] = _rank(row)
+            insort(self.ranked, self.rank_of[row["id"]])
+        self._memo.clear()
+
+    def discard(self, restaurant_id: int):
+        self._remove(restaurant_id)
+        self._memo.clear()
+
+    def _remove(self, restaurant_id: int):
+        row = self.rows.pop(restaurant_id, None)
+        if row is None:
+            return
+        for key in self.row_keys.pop(restaurant_id).split("\n")[1:]:
+            _delete(self.keys, (key, restaurant_id))
+        rank = self.rank_of.pop(restaurant_id, None)
+        if rank is not None:
+            _delete(self.ranked, rank)
+
+    def suggest(self, q: str, limit: int = 8):
+        prefix = normalize(q)
+        if not prefix:
+            return []
+        memo_key = (prefix, limit)
+        if memo_key in self._memo:
+            self._memo.move_to_end(memo_key)
+            return self._memo[memo_key]
+        keys = self.keys
+        lo = bisect_left(keys, (prefix,))
+        hi = bisect_left(keys, (prefix + _KEY_END,), lo)
+        rows = self.rows
+        if hi - lo <= SCAN_KEYS:
+            rank_of = self.rank_of
+            ids = {i for _, i in keys[lo:hi] if i in rank_of}
+            result = [rows[i] for i in heapq.nsmallest(limit, ids, key=rank_of.__getitem__)]
+        else:
+            needle = "\n" + prefix
+            row_keys = self.row_keys
+            result = []
+            for _, _, i in self.ranked:
+                if needle in row_keys[i]:
+                    result.append(rows[i])
+                    if len(result) == limit:
+                        break
+        self._memo[memo_key] = result
+        if len(self._memo) > MEMO_SIZE:
+            self._memo.popitem(last=False)
+        return result
+
+
+def _delete(items, item):
+    i = bisect_left(items, item)
+    if i < len(items) and items[i] == item:
+        del items[i]
+
+
+suggestions = SuggestIndex()
+catalog.subscribe(suggestions)
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Settings are read at import time, so they are fixed here, before any app
+# module is imported. The app under test runs on the in-memory backend;
+# SQL code is exercised against a scratch database per test (sql_sessions).
+_scratch = tempfile.mkdtemp(prefix="zomato-tests-")
+os.environ["REPOSITORY_BACKEND"] = "memory"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_scratch, 'restaurant.db')}"
+os.environ["SNAPSHOT_PATH"] = os.path.join(_scratch, "catalog.snapshot")
+os.environ["JOBS_DIR"] = os.path.join(_scratch, "jobs")
+os.environ["RATE_LIMIT_PER_SECOND"] = "100000"
+os.environ["RATE_LIMIT_BURST"] = "100000"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import migrations  # noqa: E402
+
+
+def new_restaurant(i: int, **overrides) -> dict:
+    return {
+        "name": f"Restaurant {i}",
+        "description": "Family run place",
+        "cuisine_type": "Indian",
+        "address": f"{i} Food Street",
+        "phone_number": f"+91{9000000000 + i}",
+        "rating": 4.0,
+        "is_active": True,
+        **overrides,
+    }
+
+
+@pytest.fixture
+def sql_sessions(tmp_path):
+    # run(scenario) migrates a fresh database and awaits scenario(factory)
+    # on one event loop, disposing the engine afterwards.
+    def run(scenario):
+        async def main():
+            factory = database.LazySessions(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+            try:
+                async with factory.engine.begin() as conn:
+                    await conn.run_sync(migrations._upgrade)
+                return await scenario(factory)
+            finally:
+                await factory.dispose()
+
+        return asyncio.run(main())
+
+    return run
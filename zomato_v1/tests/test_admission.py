@@ -0,0 +1,21 @@
+from starlette.requests import Request
+
+import admission
+
+
+def _request(host, client_id=None):
+    headers = [(b"x-client-id", client_id.encode())] if client_id else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (host, 1234)})
+
+
+def test_client_id_ignored_from_untrusted_peer(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", [])
+    assert admission.client_key(_request("203.0.113.7", "rotated-1")) == "203.0.113.7"
+    assert admission.client_key(_request("203.0.113.7", "rotated-2")) == "203.0.113.7"
+
+
+def test_client_id_believed_from_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXIES", [admission.ipaddress.ip_network("10.0.0.0/8")])
+    assert admission.client_key(_request("10.1.2.3", "alice")) == "id:alice"
+    assert admission.client_key(_request("10.1.2.3")) == "10.1.2.3"
+    assert admission.client_key(_request("203.0.113.7", "alice")) == "203.0.113.7"
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+import crud
+from schemas import RestaurantCreate, RestaurantUpdate
+
+from conftest import new_restaurant
+
+
+def test_archived_id_is_not_reused(sql_sessions):
+    async def scenario(factory):
+        async with factory() as db:
+            for i in range(1, 4):
+                await crud.create_restaurant(db, RestaurantCreate(**new_restaurant(i)))
+            await crud.update_restaurant(db, 3, RestaurantUpdate(is_active=False))
+            future = datetime.now(timezone.utc) + timedelta(days=1)
+            assert await crud.archive_inactive_restaurants(db, future, 10) == [3]
+
+            created = await crud.create_restaurant(db, RestaurantCreate(**new_restaurant(4)))
+            assert created.id == 4
+            assert (await crud.get_restaurant(db, 3)).name == "Restaurant 3"
+
+            await crud.update_restaurant(db, 4, RestaurantUpdate(is_active=False))
+            assert await crud.archive_inactive_restaurants(db, future, 10) == [4]
+
+    sql_sessions(scenario)
+
+
+def test_shard_ids_skip_archived_ids(sql_sessions):
+    async def scenario(factory):
+        async with factory() as db:
+            first = await crud.create_restaurant(db, RestaurantCreate(**new_restaurant(1, is_active=False)), shard=(1, 3))
+            assert first.id == 1
+            future = datetime.now(timezone.utc) + timedelta(days=1)
+            assert await crud.archive_inactive_restaurants(db, future, 10) == [1]
+            second = await crud.create_restaurant(db, RestaurantCreate(**new_restaurant(2)), shard=(1, 3))
+            assert second.id == 4
+
+    sql_sessions(scenario)
@@ -0,0 +1,62 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+from conftest import new_restaurant
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.mark.parametrize("field", ["cuisine_type", "address", "rating", "is_active"])
+def test_null_for_not_null_column_is_rejected(client, field):
+    response = client.patch("/restaurants/batch", json={"ids": [1], "updates": {field: None}})
+    assert response.status_code == 422
+
+
+def test_null_allowed_for_nullable_column(client):
+    restaurant_id = client.post("/restaurants/", json=new_restaurant(400)).json()["id"]
+    response = client.patch("/restaurants/batch", json={"ids": [restaurant_id], "updates": {"description": None}})
+    assert response.status_code == 200
+    assert client.get(f"/restaurants/{restaurant_id}").json()["description"] is None
+
+
+def test_idempotency_key_bound_to_request(client):
+    restaurant_id = client.post("/restaurants/", json=new_restaurant(401)).json()["id"]
+    headers = {"Idempotency-Key": "batch-401"}
+    first = client.patch("/restaurants/batch", headers=headers, json={"ids": [restaurant_id], "updates": {"rating": 2.0}})
+    retry = client.patch("/restaurants/batch", headers=headers, json={"updates": {"rating": 2.0}, "ids": [restaurant_id]})
+    assert retry.json() == first.json()
+
+    reused = client.patch("/restaurants/batch", headers=headers, json={"ids": [restaurant_id], "updates": {"rating": 3.0}})
+    assert reused.status_code == 422
+    assert client.get(f"/restaurants/{restaurant_id}").json()["rating"] == 2.0
+
+
+def test_blank_idempotency_key_is_no_key(client):
+    ids = [client.post("/restaurants/", json=new_restaurant(i)).json()["id"] for i in (402, 403)]
+    headers = {"Idempotency-Key": " "}
+    first = client.patch("/restaurants/batch", headers=headers, json={"ids": [ids[0]], "updates": {"rating": 2.0}})
+    second = client.patch("/restaurants/batch", headers=headers, json={"ids": [ids[1]], "updates": {"rating": 2.0}})
+    assert first.status_code == second.status_code == 200
+    assert second.json()["results"] == [{"id": ids[1], "status": "updated"}]
+
+
+def test_idempotency_keys_are_per_client(client):
+    restaurant_id = client.post("/restaurants/", json=new_restaurant(404)).json()["id"]
+    headers = {"Idempotency-Key": "shared"}
+    client.patch("/restaurants/batch", headers=headers, json={"ids": [restaurant_id], "updates": {"rating": 2.0}})
+    # Same app without running its lifespan a second time.
+    other = TestClient(main.app, client=("203.0.113.9", 50000))
+    response = other.patch("/restaurants/batch", headers=headers, json={"ids": [restaurant_id], "updates": {"rating": 3.0}})
+    assert response.status_code == 200
+    assert client.get(f"/restaurants/{restaurant_id}").json()["rating"] == 3.0
+
+
+def test_batch_rejects_equal_opening_and_closing_time(client):
+    updates = {"opening_time": "09:00:00", "closing_time": "09:00:00"}
+    assert client.patch("/restaurants/batch", json={"ids": [1], "updates": updates}).status_code == 422
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import threading
+
+import jobs
+from cache import CatalogCache
+from repository import memory_repository
+
+from conftest import new_restaurant
+
+
+class _Context:
+    # Runs CPU steps inline and asks for a requeue after stop_after reports.
+    def __init__(self, job_id, stop_after=None):
+        self.id = job_id
+        self.stop = None
+        self.reports = 0
+        self.stop_after = stop_after
+
+    async def progress(self, fraction, message=None, force=False):
+        self.reports += 1
+        if self.reports == self.stop_after:
+            self.stop = "requeue"
+            raise jobs.JobCancelled()
+
+    async def cpu(self, fn, *args):
+        return fn(*args)
+
+
+def test_requeued_import_keeps_upload_and_resumes(tmp_path, monkeypatch):
+    saved = {}
+
+    async def record(job_id, **values):
+        saved.update(values)
+
+    monkeypatch.setattr(jobs, "_set", record)
+    monkeypatch.setattr(jobs, "JOB_IMPORT_CHUNK", 2)
+    path = tmp_path / "import.json"
+    path.write_text(json.dumps([new_restaurant(700 + i) for i in range(5)]))
+    params = {"path": str(path)}
+
+    try:
+        asyncio.run(jobs.import_job(_Context(1, stop_after=1), params))
+    except jobs.JobCancelled:
+        pass
+    assert path.exists()
+    params = json.loads(saved["params"])
+    assert params["offset"] == 2
+
+    assert asyncio.run(jobs.import_job(_Context(1), params)) == {"imported": 5}
+    assert not path.exists()
+    names = {r.name for r in memory_repository.rows()}
+    assert {f"Restaurant {700 + i}" for i in range(5)} <= names
+
+
+class _BlockingIndex:
+    def __init__(self):
+        self.ids = set()
+        self.building = threading.Event()
+        self.release = threading.Event()
+
+    def build(self, rows):
+        self.building.set()
+        self.release.wait(5)
+        return {r["id"] for r in rows}
+
+    def swap(self, built):
+        self.ids = built
+
+    def put(self, row):
+        self.ids.add(row["id"])
+
+    def discard(self, restaurant_id):
+        self.ids.discard(restaurant_id)
+
+
+def test_changes_during_warm_survive_the_swap():
+    catalog = CatalogCache()
+    index = _BlockingIndex()
+    catalog.subscribe(index)
+    row = {"id": 1, "name": "A", "description": None, "cuisine_type": "Thai", "rating": 4.0, "is_active": True, "opening_time": None, "closing_time": None}
+    catalog.source = lambda: [row]
+
+    async def scenario():
+        warm = asyncio.create_task(catalog.warm())
+        # The loop stays free while the index builds in a thread.
+        await asyncio.to_thread(index.building.wait, 5)
+        catalog.put({**row, "id": 2})
+        catalog.discard(1)
+        index.release.set()
+        await warm
+
+    asyncio.run(scenario())
+    assert index.ids == {2}
+    assert catalog.cuisines() == [("Thai", 1)]
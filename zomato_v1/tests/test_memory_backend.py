@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import database
+import main
+
+from conftest import new_restaurant
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as c:
+        # The catalog loads in the background; wait until it has.
+        while c.get("/ready").status_code != 200:
+            time.sleep(0.01)
+        yield c
+
+
+def _ids(response):
+    return [r["id"] for r in response.json()]
+
+
+def test_database_is_never_opened(client):
+    client.post("/restaurants/", json=new_restaurant(100))
+    client.get("/restaurants/")
+    assert not os.path.exists(database.DATABASE_URL.partition(":///")[2])
+
+
+def test_catalog_follows_the_repository(client):
+    created = client.post("/restaurants/", json=new_restaurant(200, name="Zebra Curry House", cuisine_type="Ethiopian"))
+    assert created.status_code == 201
+    restaurant_id = created.json()["id"]
+
+    assert restaurant_id in _ids(client.get("/restaurants/suggest", params={"q": "zebra cur"}))
+    assert {"cuisine_type": "Ethiopian", "count": 1} in client.get("/restaurants/cuisines").json()
+
+    client.post("/restaurants/", json=new_restaurant(201, cuisine_type="Ethiopian"))
+    similar = _ids(client.get(f"/restaurants/{restaurant_id}/similar"))
+    assert similar and all(client.get(f"/restaurants/{i}").status_code == 200 for i in similar)
+
+
+def test_bulk_and_batch_use_memory(client):
+    created = client.post("/restaurants/bulk", json=[new_restaurant(i, cuisine_type="Basque") for i in range(300, 305)])
+    assert created.status_code == 201
+    ids = created.json()["ids"]
+    assert all(client.get(f"/restaurants/{i}").status_code == 200 for i in ids)
+
+    duplicate = client.post("/restaurants/bulk", json=[new_restaurant(305), new_restaurant(300)])
+    assert duplicate.status_code == 409
+    assert client.get("/restaurants/suggest", params={"q": "Restaurant 305"}).json() == []
+
+    updated = client.patch("/restaurants/batch", json={"ids": ids[:2] + [999999], "updates": {"rating": 1.5}})
+    assert [r["status"] for r in updated.json()["results"]] == ["updated", "updated", "not_found"]
+    assert client.get(f"/restaurants/{ids[0]}").json()["rating"] == 1.5
+
+    deactivated = client.patch("/restaurants/batch", json={"filter": {"cuisine_type": "Basque"}, "updates": {"is_active": False}})
+    assert deactivated.json()["affected"] == 5
+    assert not set(ids) & set(_ids(client.get("/restaurants/active", params={"limit": 100})))
+
+    deleted = client.request("DELETE", "/restaurants/batch", json={"ids": ids[3:]})
+    assert deleted.json()["affected"] == 2
+    assert client.get(f"/restaurants/{ids[4]}").status_code == 404
+
+
+def test_sql_only_routes_are_not_mounted(client):
+    assert client.get("/jobs/").status_code == 404
+    assert client.get("/restaurants/changes/stream").status_code == 404
@@ -0,0 +1,23 @@
+import time
+
+import pytest
+from starlette.requests import Request
+from starlette.responses import Response
+
+import database
+
+
+def _request(token):
+    headers = [(database.CONSISTENCY_HEADER.lower().encode(), token.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_token_from_a_write_is_honoured():
+    response = Response()
+    database.mark_wrote(response)
+    assert database.wrote_recently(_request(response.headers[database.CONSISTENCY_HEADER]))
+
+
+@pytest.mark.parametrize("token", ["9e12", "inf", "nan", "garbage", str(time.time() - 1)])
+def test_made_up_or_expired_token_is_ignored(token):
+    assert not database.wrote_recently(_request(token))
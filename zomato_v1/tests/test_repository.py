@@ -0,0 +1,19 @@
+import pytest
+
+import database
+from repository import InMemoryRestaurantRepository, RestaurantRepository, ShardedRestaurantRepository, SqlAlchemyRestaurantRepository
+
+
+def test_every_backend_implements_the_interface():
+    InMemoryRestaurantRepository()
+    ShardedRestaurantRepository()
+    SqlAlchemyRestaurantRepository(database.async_session())
+
+
+def test_incomplete_backend_fails_when_built():
+    class Partial(RestaurantRepository):
+        async def get_restaurant(self, restaurant_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
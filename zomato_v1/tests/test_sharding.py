@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import database
+import migrations
+from repository import ShardedRestaurantRepository
+from schemas import RestaurantCreate, RestaurantUpdate
+
+from conftest import new_restaurant
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    # run(scenario) awaits scenario(repo) against two fresh shard databases.
+    def run(scenario):
+        async def main():
+            sessions = [database.LazySessions(f"sqlite+aiosqlite:///{tmp_path / f'shard{i}.db'}") for i in range(2)]
+            try:
+                for factory in sessions:
+                    async with factory.engine.begin() as conn:
+                        await conn.run_sync(migrations._upgrade)
+                return await scenario(ShardedRestaurantRepository(sessions))
+            finally:
+                for factory in sessions:
+                    await factory.dispose()
+
+        return asyncio.run(main())
+
+    return run
+
+
+def _cities_on_different_shards(repo):
+    by_shard = {}
+    for city in ("Pune", "Mumbai", "Delhi", "Goa", "Chennai", "Kochi"):
+        by_shard.setdefault(repo.shard_for_city(city), city)
+    return list(by_shard.values())[:2]
+
+
+def test_name_is_unique_across_shards(sharded):
+    async def scenario(repo):
+        first, second = _cities_on_different_shards(repo)
+        await repo.create_restaurant(RestaurantCreate(**new_restaurant(800, city=first)))
+        with pytest.raises(IntegrityError):
+            await repo.create_restaurant(RestaurantCreate(**new_restaurant(801, city=second, name="Restaurant 800")))
+        with pytest.raises(IntegrityError):
+            await repo.bulk_create_restaurants([RestaurantCreate(**new_restaurant(802, city=second, phone_number="+919000000800"))])
+        with pytest.raises(IntegrityError):
+            # Repeated within one request, bound for two shards.
+            await repo.bulk_create_restaurants([
+                RestaurantCreate(**new_restaurant(803, city=first)),
+                RestaurantCreate(**new_restaurant(804, city=second, name="Restaurant 803")),
+            ])
+        other = await repo.create_restaurant(RestaurantCreate(**new_restaurant(805, city=second)))
+        with pytest.raises(IntegrityError):
+            await repo.update_restaurant(other.id, RestaurantUpdate(name="Restaurant 800"))
+        # Keeping its own name is not a conflict.
+        assert (await repo.update_restaurant(other.id, RestaurantUpdate(name="Restaurant 805", rating=3.0))).rating == 3.0
+        return await repo.count_restaurants()
+
+    assert sharded(scenario) == 2
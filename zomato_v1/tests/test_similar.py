@@ -0,0 +1,11 @@
+import numpy as np
+
+import similar
+
+
+def test_popcount_fallback_matches_bitwise_count():
+    values = np.array([0, 1, similar.FULL_DAY, 2 ** 64 - 1, 0b1011 << 40], dtype=np.uint64)
+    expected = [bin(int(v)).count("1") for v in values]
+    assert similar._popcount_bytes(values).tolist() == expected
+    assert similar._popcount_bytes(values[::2]).tolist() == expected[::2]
+    assert np.asarray(similar._popcount(values)).tolist() == expected